@@ -0,0 +1,116 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures decoding a frame of nested documents, without a server.
+
+Run from the repository root with ``PYTHONPATH=. python
+benchmarks/bench_documents.py [documents]``.  ``before`` copies every
+document into a ``ProtoValue`` and decodes it recursively, like the
+driver did before, ``dicts`` is the current default, ``lazy`` reads one
+key of each document and ``ndjson`` writes JSON lines.
+"""
+import json
+import sys
+import time
+
+import polypheny.rows
+from polypheny import connection
+from polypheny.serialize import proto2py
+from org.polypheny.prism import protointerface_pb2, value_pb2
+
+
+def make_frame(documents):
+    frame = protointerface_pb2.Response().frame
+    df = frame.document_frame
+    for i in range(documents):
+        d = df.documents.add()
+        e = d.entries.add()
+        e.key.string.string = 'id'
+        e.value.integer.integer = i
+        e = d.entries.add()
+        e.key.string.string = 'customer'
+        for key, value in (('name', f'name{i}'), ('city', 'Basel'), ('street', 'Spalenring')):
+            c = e.value.document.entries.add()
+            c.key.string.string = key
+            c.value.string.string = value
+        e = d.entries.add()
+        e.key.string.string = 'items'
+        for j in range(5):
+            item = e.value.list.values.add().document
+            for key, value in (('sku', j), ('quantity', j + 1)):
+                c = item.entries.add()
+                c.key.string.string = key
+                c.value.integer.integer = value
+    frame.is_last = True
+    return frame
+
+
+def decode_recursive(value):
+    field = value.WhichOneof('value')
+    if field == 'document':
+        return {proto2py(entry.key): decode_recursive(entry.value) for entry in value.document.entries}
+    if field == 'list':
+        return [decode_recursive(v) for v in value.list.values]
+    return proto2py(value)
+
+
+def before(frame):
+    results = []
+    for n in frame.document_frame.documents:
+        value = value_pb2.ProtoValue()
+        value.document.CopyFrom(n)
+        results.append(decode_recursive(value))
+    return results
+
+
+def dicts(frame):
+    return connection.decode_documents(frame)
+
+
+def lazy(frame):
+    return [document['id'] for document in polypheny.rows.lazy_document(frame)]
+
+
+def ndjson(frame):
+    return polypheny.rows.ndjson_document(frame)
+
+
+def dicts_to_ndjson(frame):
+    return [json.dumps(document).encode() + b'\n' for document in connection.decode_documents(frame)]
+
+
+def bench(name, f, frame, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:>12}: {len(result)} documents in {best:.3f}s, {len(result) / best:,.0f} documents/s '
+          f'(best of {repeat})')
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    frame = make_frame(n)
+    assert bench('before', before, frame) == bench('dicts', dicts, frame)
+    bench('lazy', lazy, frame)
+    lines = bench('dicts+json', dicts_to_ndjson, frame)
+    assert [json.loads(line) for line in bench('ndjson', ndjson, frame)] == [json.loads(line) for line in lines]
+
+
+if __name__ == '__main__':
+    main()
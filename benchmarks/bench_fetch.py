@@ -0,0 +1,205 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures Cursor.fetchall on an in-memory result, without a server.
+
+Run from the repository root with ``PYTHONPATH=. python
+benchmarks/bench_fetch.py [rows]``.  The frames are built up front and
+handed out by a stub connection, so only the client side decoding is
+measured.
+"""
+import sys
+import time
+
+import polypheny.rows
+from polypheny import connection
+from polypheny.connection import describe
+from polypheny.serialize import proto2py
+from org.polypheny.prism import protointerface_pb2, relational_frame_pb2, value_pb2
+
+FRAME_SIZE = 1000
+
+
+def make_frames(rows):
+    frames = []
+    for start in range(0, rows, FRAME_SIZE):
+        frame = protointerface_pb2.Response().frame
+        rf = frame.relational_frame
+        for name, t, nullable in (('id', 'INTEGER', False), ('name', 'VARCHAR', True), ('big', 'BIGINT', False),
+                                  ('d', 'DOUBLE', True), ('b', 'BOOLEAN', False)):
+            cm = rf.column_meta.add()
+            cm.column_label = name
+            cm.is_nullable = nullable
+            cm.type_meta.proto_value_type = value_pb2.ProtoPolyType.Value(t)
+        for i in range(start, min(rows, start + FRAME_SIZE)):
+            row = rf.rows.add()
+            row.values.add().integer.integer = i
+            if i % 10 == 0:
+                row.values.add().null.SetInParent()
+            else:
+                row.values.add().string.string = f'name{i}'
+            row.values.add().long.long = i * 2 ** 33
+            row.values.add().double.double = i / 2
+            row.values.add().boolean.boolean = i % 2 == 0
+        frame.is_last = start + FRAME_SIZE >= rows
+        frames.append(frame)
+    return frames
+
+
+class StubRpc:
+    broken = None
+
+    def __init__(self, frames):
+        self.frames = iter(frames)
+
+    def fetch(self, statement_id, fetch_size, wait=True):
+        return next(self.frames)
+
+    def close_statement(self, statement_id, wait=True):
+        pass
+
+    def close_result(self, statement_id, wait=True):
+        pass
+
+
+class StubConnection:
+    pipelining = False
+    row_factory = None
+    document_factory = None
+
+    def __init__(self, frames):
+        self.con = StubRpc(frames)
+        self.statement_cache = connection.StatementCache(0)
+        self.cursors = set()
+
+
+def convert(n):
+    """ The per row conversion used before frames were decoded at once. """
+    if isinstance(n, relational_frame_pb2.Row):
+        v = []
+        for value in n.values:
+            v.append(proto2py(value))
+        return v
+    raise TypeError(type(n))
+
+
+class LegacyCursor:
+    """ The row at a time fetchall of the cursor before frames were decoded at once. """
+
+    def __init__(self, frames):
+        self.con = object()
+        self.frames = iter(frames)
+        self.frame = next(self.frames)
+        self.rows = iter(self.frame.relational_frame.rows)
+
+    def next(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            if self.frame.is_last:
+                raise
+            self.frame = next(self.frames)
+            self.rows = iter(self.frame.relational_frame.rows)
+            return next(self.rows)
+
+    def fetchone(self):
+        if self.con is None:
+            raise RuntimeError("Cursor is closed")
+        try:
+            n = self.next()
+        except StopIteration:
+            return None
+        return convert(n)
+
+    def fetchall(self):
+        results = []
+        while True:
+            row = self.fetchone()
+            if row is None:
+                break
+            results.append(row)
+        return results
+
+
+def fetchall_before(frames):
+    return LegacyCursor(frames).fetchall()
+
+
+def fetchall_after(frames, row_factory=None):
+    con = StubConnection(frames[1:])
+    cur = connection.Cursor(con)
+    con.cursors.add(cur)
+    cur.derive_description(frames[0].relational_frame)
+    cur.result = connection.ResultCursor(con, 1, frames[0], None, row_factory=row_factory)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def first_column(frames, row_factory=None):
+    """ A scan that only reads the first column. """
+    rows = fetchall_after(frames, row_factory)
+    return [row[0] for row in rows]
+
+
+def first_column_lazy(frames):
+    return first_column(frames, polypheny.rows.lazy_row)
+
+
+def fetchall_tuples(frames):
+    return fetchall_after(frames, polypheny.rows.tuple_row)
+
+
+def dicts_before(frames):
+    """ Dicts built from the list rows, as applications did. """
+    rows = fetchall_after(frames)
+    names = [column[0] for column in describe(frames[0].relational_frame)]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def dicts_after(frames):
+    return fetchall_after(frames, polypheny.rows.dict_row)
+
+
+def bench(name, f, frames, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:>8}: {len(result)} rows in {best:.3f}s, {len(result) / best:,.0f} rows/s (best of {repeat})')
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    frames = make_frames(n)
+    before = bench('before', fetchall_before, frames)
+    after = bench('after', fetchall_after, frames)
+    assert list(map(list, before)) == list(map(list, after))
+    tuples = bench('tuples', fetchall_tuples, frames)
+    assert list(map(list, tuples)) == list(map(list, after))
+    before = bench('dict+zip', dicts_before, frames)
+    after = bench('dict_row', dicts_after, frames)
+    assert before == after
+    # Wide rows of which only one column is read, with eager and lazy rows
+    eager = bench('eager', first_column, frames)
+    lazy = bench('lazy', first_column_lazy, frames)
+    assert eager == lazy
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cells per second of py2proto and proto2py for each value type.
+
+Run from the repository root with ``PYTHONPATH=. python
+benchmarks/bench_serialize.py``.  ``before`` is the if/elif chain the
+driver used before the dispatch tables, ``after`` is the current
+:py:mod:`polypheny.serialize`.
+"""
+import datetime
+import decimal
+import timeit
+
+import polypheny.interval as interval
+from org.polypheny.prism import value_pb2
+from polypheny.serialize import py2proto, proto2py, serialize_big_decimal, parse_big_decimal
+
+def legacy_py2proto(value, v=None):
+    if v is None:
+        v = value_pb2.ProtoValue()
+    if type(value) is bool:
+        v.boolean.boolean = value
+    elif type(value) is int:
+        if -2 ** 31 <= value <= 2 ** 31 - 1:
+            v.integer.integer = value
+        elif -2 ** 63 <= value <= 2 ** 63 - 1:
+            v.long.long = value
+        else:
+            serialize_big_decimal(v, decimal.Decimal(value))
+    elif type(value) is float:
+        # TODO: Always use decimal?
+        v.double.double = value
+    elif type(value) is decimal.Decimal:
+        serialize_big_decimal(v, value)
+    elif type(value) is datetime.date:
+        diff = value - datetime.date(1970, 1, 1)
+        v.date.date = diff.days
+    elif type(value) is datetime.time:
+        v.time.time = (value.hour * 3600 + value.minute * 60 + value.second) * 1000 + value.microsecond * 10
+    elif type(value) is datetime.datetime:
+        v.timestamp.timestamp = int(value.timestamp() * 1000)
+    elif type(value) is str:
+        v.string.string = value
+    elif type(value) is bytes:
+        v.binary.binary = value
+    elif value is None:
+        v.null.CopyFrom(value_pb2.ProtoNull())
+    elif type(value) is list:
+        for element in value:
+            v.list.values.append(legacy_py2proto(element))
+    else:
+        raise NotImplementedError
+
+    return v
+
+
+def legacy_proto2py(value):
+    name = value.WhichOneof("value")
+    assert name is not None
+    if name == "boolean":
+        return value.boolean.boolean
+    elif name == "integer":
+        return value.integer.integer
+    elif name == "long":
+        return value.long.long
+    elif name == "big_decimal":
+        return parse_big_decimal(value.big_decimal)
+    elif name == "float":
+        return value.float.float
+    elif name == "double":
+        return value.double.double
+    elif name == "date":
+        return datetime.date(1970, 1, 1) + datetime.timedelta(days=value.date.date)
+    elif name == "time":
+        t = value.time.time
+        millis = t % 1000
+        t = t / 1000
+        hour = int(t / 3600)
+        t = t % 3600
+        minute = int(t / 60)
+        t = t % 60
+        second = int(t)
+        return datetime.time(hour, minute, second, microsecond=int(millis * 1000))
+    elif name == "timestamp":
+        return datetime.datetime.fromtimestamp(value.timestamp.timestamp / 1000, datetime.timezone.utc)
+    elif name == "interval":
+        return interval.IntervalMonthMilliseconds(value.interval.months, value.interval.milliseconds)
+    elif name == "string":
+        return value.string.string
+    elif name == "binary":
+        return value.binary.binary
+    elif name == "null":
+        return None
+    elif name == "list":
+        return list(map(lambda e: legacy_proto2py(e), value.list.values))
+    elif name == "document":
+        res = {}
+        for entry in value.document.entries:
+            k = legacy_proto2py(entry.key)
+            assert isinstance(k, str)  # TODO: Correct?
+            v = legacy_proto2py(entry.value)
+            res[k] = v
+        return res
+    else:
+        raise RuntimeError("Unhandled value type")
+
+
+VALUES = {
+    'boolean': True,
+    'integer': 42,
+    'long': 2 ** 40,
+    'big_decimal': decimal.Decimal('-1234.5678'),
+    'double': 3.25,
+    'date': datetime.date(2024, 5, 17),
+    'time': datetime.time(13, 37, 42),
+    'timestamp': datetime.datetime(2024, 5, 17, 13, 37, 42, tzinfo=datetime.timezone.utc),
+    'string': 'Polypheny',
+    'binary': b'\x00\x01\x02',
+    'null': None,
+    'list': [1, 2, 3],
+}
+
+
+def compare(before, after, arg, n, repeat=15):
+    """
+    Cells per second of the fastest run of each function.  The runs
+    alternate, so both see the same machine load.
+    """
+    times = ([], [])
+    for _ in range(repeat):
+        for f, t in zip((before, after), times):
+            t.append(timeit.timeit(lambda: f(arg), number=n))
+    return n / min(times[0]), n / min(times[1])
+
+
+def main():
+    n = 20000
+    print(f'{"type":>12} {"encode before":>14} {"encode after":>13} {"decode before":>14} {"decode after":>13}  cells/s')
+    for name, value in VALUES.items():
+        proto = py2proto(value)
+        assert legacy_py2proto(value) == proto
+        assert legacy_proto2py(proto) == proto2py(proto)
+        encode = compare(legacy_py2proto, py2proto, value, n)
+        decode = compare(legacy_proto2py, proto2py, proto, n)
+        print(f'{name:>12} {encode[0]:>14,.0f} {encode[1]:>13,.0f} {decode[0]:>14,.0f} {decode[1]:>13,.0f}')
+
+
+if __name__ == '__main__':
+    main()
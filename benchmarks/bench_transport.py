@@ -0,0 +1,123 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the old concatenating send path with the vectored one.
+
+Run from the repository root with ``PYTHONPATH=. python
+benchmarks/bench_transport.py``.  For each payload size it reports
+system calls and payload bytes copied per request, for single sends and
+for a queue of requests coalesced into one call.
+"""
+import socket
+import threading
+import time
+
+from polypheny import rpc
+
+
+class CountingSocket:
+    """ Wraps a socket and counts send system calls. """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+
+    def sendall(self, data):
+        self.calls += 1
+        return self.sock.sendall(data)
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        return self.sock.sendmsg(buffers)
+
+    def close(self):
+        self.sock.close()
+
+
+class LegacyTransport(rpc.PlainTransport):
+    copied = 0
+
+    def send_msg(self, serialized):
+        n = len(serialized)
+        bl = n.to_bytes(length=8, byteorder='little')
+        self.copied += n + 8
+        self.con.sendall(bl + serialized)
+
+    def send_msgs(self, messages):
+        for serialized in messages:
+            self.send_msg(serialized)
+
+
+class VectoredTransport(rpc.PlainTransport):
+    copied = 0
+
+    def send_msg(self, serialized):
+        if len(serialized) <= rpc.SMALL_MESSAGE_SIZE:
+            self.copied += len(serialized) + 8
+        super().send_msg(serialized)
+
+    def sendv(self, buffers):
+        if not hasattr(self.con.sock, 'sendmsg'):
+            self.copied += sum(map(len, buffers))
+            self.con.calls += 1
+            self.con.sock.sendall(b''.join(buffers))
+            return
+        super().sendv(buffers)
+
+
+def make(cls):
+    a, b = socket.socketpair()
+    t = cls.__new__(cls)
+    t.con = CountingSocket(a)
+
+    def drain():
+        while b.recv(1 << 20):
+            pass
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    return t, b, reader
+
+
+def run(cls, payload, requests, batch):
+    t, b, reader = make(cls)
+    start = time.perf_counter()
+    for _ in range(requests // batch):
+        if batch == 1:
+            t.send_msg(payload)
+        else:
+            t.send_msgs([payload] * batch)
+    elapsed = time.perf_counter() - start
+    calls, copied = t.con.calls, t.copied
+    t.con.close()
+    reader.join()
+    b.close()
+    return calls / requests, copied / requests, elapsed / requests * 1e6
+
+
+def main():
+    requests = 4096
+    print(f'{"payload":>10} {"batch":>5} {"path":>9} {"syscalls/req":>13} {"copied B/req":>13} {"us/req":>8}')
+    for size in (64, 4096, 1 << 16, 1 << 20):
+        payload = b'x' * size
+        n = requests if size < (1 << 20) else 256
+        for batch in (1, 16):
+            for name, cls in (('before', LegacyTransport), ('after', VectoredTransport)):
+                calls, copied, us = run(cls, payload, n, batch)
+                print(f'{size:>10} {batch:>5} {name:>9} {calls:>13.3f} {copied:>13.0f} {us:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
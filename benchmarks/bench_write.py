@@ -0,0 +1,93 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures building the batch requests for a DataFrame, without a server.
+
+Run from the repository root with ``PYTHONPATH=. python
+benchmarks/bench_write.py [rows]``.  ``executemany`` is the rows of
+``DataFrame.itertuples`` encoded value by value like
+:py:meth:`polypheny.Cursor.executemany` does, ``write_table`` is the
+column-wise encoding of :py:meth:`polypheny.Connection.write_table`.
+Needs pandas.
+"""
+import itertools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from polypheny import columns, connection, rpc
+
+
+class StubRpc(rpc.Connection):
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.size = 0
+
+    def request(self, msg, field, wait):
+        self.size += len(msg.SerializeToString())
+        return msg
+
+
+def make_frame(rows):
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'name': [f'name{i}' for i in range(rows)],
+        'price': np.random.default_rng(0).random(rows),
+        'joined': pd.date_range('2024-01-01', periods=rows, freq='s', tz='UTC'),
+        'active': np.arange(rows) % 2 == 0,
+    })
+
+
+def write_before(df, chunk_rows):
+    con = StubRpc()
+    rows = [list(row) for row in df.itertuples(index=False)]
+    for start in range(0, len(rows), chunk_rows):
+        con.execute_indexed_statement_batch(1, [[v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in r]
+                                                for r in rows[start:start + chunk_rows]])
+    return con.size
+
+
+def write_after(df, chunk_rows):
+    con = StubRpc()
+    _, values, encoders = columns.table_columns(df)
+    for start in range(0, len(values[0]), chunk_rows):
+        con.execute_indexed_statement_batch(1, zip(*[column[start:start + chunk_rows] for column in values]),
+                                            encoders=encoders)
+    return con.size
+
+
+def bench(name, f, df, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = f(df, connection.WRITE_TABLE_CHUNK_ROWS)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:>12}: {len(df)} rows in {best:.3f}s, {len(df) / best:,.0f} rows/s (best of {repeat})')
+    return size
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    df = make_frame(rows)
+    before = bench('executemany', write_before, df)
+    after = bench('write_table', write_after, df)
+    assert before == after
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from polypheny.connection import Connection, Cursor
+from polypheny.connection import Connection, Cursor, FetchSizeTuner
 from polypheny.exceptions import *
 
 import datetime
@@ -56,28 +56,75 @@ def Binary(string):
     return string.encode('UTF-8')
 
 
-# Intentionally omitted, we always give type_code = None, like sqlite3
-# STRING = 1
-# BINARY = 2
-# NUMBER = 3
-# DATETIME = 4
-# ROWID = 5
+class DBAPITypeObject:
+    """
+    Compares equal to the ``type_code`` in :py:attr:`Cursor.description`
+    of every Polypheny type it stands for.  The type codes are the
+    names of the Polypheny types, like ``'VARCHAR'``.
+
+    >>> import polypheny
+    >>> cur.execute('SELECT name FROM fruits')
+    >>> cur.description[0][1] == polypheny.STRING
+    True
+    """
+
+    def __init__(self, *values):
+        self.values = frozenset(values)
+
+    def __eq__(self, other):
+        if isinstance(other, DBAPITypeObject):
+            return self.values == other.values
+        return other in self.values
+
+    def __hash__(self):
+        return hash(self.values)
+
+    def __repr__(self):
+        return f'DBAPITypeObject({", ".join(map(repr, sorted(self.values)))})'
+
+
+STRING = DBAPITypeObject('CHAR', 'VARCHAR', 'TEXT')
+BINARY = DBAPITypeObject('BINARY', 'VARBINARY', 'AUDIO', 'FILE', 'IMAGE', 'VIDEO')
+NUMBER = DBAPITypeObject('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'DECIMAL', 'REAL', 'FLOAT', 'DOUBLE')
+DATETIME = DBAPITypeObject('DATE', 'TIME', 'TIMESTAMP')
+ROWID = DBAPITypeObject('ROW_ID')
 
 
 def connect(address: Union[tuple[str, int], str] = None, *, username: str = None, password: str = None,
             transport: str = None, **kwargs) -> Connection:
     """
     Connect to a Polypheny instance with the given parameters.  When
-    no parameters are given, the driver will connect via the ``unix``
-    transport to ``~/.polypheny/polypheny-prism.sock``.
+    no address, transport, username and password are given, the driver
+    will connect via the ``unix`` transport to
+    ``~/.polypheny/polypheny-prism.sock``, with any other options.
 
     :param address:  A :py:class:`str` for ``unix`` transport or a (hostname, port) :py:class:`tuple` for ``plain`` transport.
     :param username:  username
     :param password:  password
     :param transport:  Either ``plain`` or ``unix``
+    :param max_frame_size:  Largest message in bytes the driver accepts
+                            from the server, defaults to 1 GiB.
+    :param pipelining:  When ``True``, requests whose response is not
+                        needed right away, like closing a result, are
+                        not waited for and are sent together with the
+                        next request.  Errors of such requests are
+                        ignored.
+    :param statement_cache_size:  Number of prepared statements kept per
+                                  connection for reuse, defaults to 32.
+                                  ``0`` disables the cache.
+    :param row_factory:  Row factory from :py:mod:`polypheny.rows` the
+                         cursors of the connection start with.
+    :param tuple_rows:  When ``True``, rows are tuples instead of lists,
+                        which is cheaper.  Same as
+                        ``row_factory=polypheny.rows.tuple_row``.
+    :param document_factory:  Document factory from :py:mod:`polypheny.rows`
+                              the cursors of the connection start with.
+    :param autocommit:  When ``True``, the server commits every
+                        statement right away.  See
+                        :py:attr:`Connection.autocommit`.
 
     """
-    if address is None and transport is None and username is None and password is None and len(kwargs) == 0:
+    if address is None and transport is None and username is None and password is None:
         transport = 'unix'
     elif address is None or transport is None:
         raise Error("Address and transport must be given")
@@ -0,0 +1,796 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+:py:mod:`asyncio` version of the driver.  The classes mirror
+:py:class:`polypheny.Connection` and :py:class:`polypheny.Cursor`, but
+every method that talks to Polypheny is a coroutine.
+
+>>> import asyncio
+>>> import polypheny.aio
+>>> async def main():
+...     con = await polypheny.aio.connect()
+...     cur = con.cursor()
+...     await cur.execute('SELECT id, name FROM fruits')
+...     async for row in cur:
+...         print(row)
+...     await con.close()
+>>> asyncio.run(main())  # doctest: +SKIP
+[1, 'Orange']
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from typing import List, Any, Union
+
+from polypheny import columns
+from polypheny import connection
+from polypheny import rows
+from polypheny import rpc
+from polypheny.exceptions import *
+from org.polypheny.prism import protointerface_pb2
+
+
+class StreamTransport:
+    """
+    Framing of :py:class:`polypheny.rpc.PlainTransport` on top of an
+    :py:class:`asyncio.StreamReader` and :py:class:`asyncio.StreamWriter`.
+    """
+
+    def __init__(self, reader, writer, max_frame_size):
+        self.reader = reader
+        self.writer = writer
+        if max_frame_size is None:
+            max_frame_size = rpc.DEFAULT_MAX_FRAME_SIZE
+        self.max_frame_size = max_frame_size
+
+    @classmethod
+    async def open(cls, address, transport, max_frame_size):
+        if transport == "plain":
+            reader, writer = await asyncio.open_connection(*address)
+            version = rpc.PlainTransport.VERSION
+        elif transport == "unix":
+            if address is None:
+                address = os.path.expanduser("~/.polypheny/polypheny-prism.sock")
+            reader, writer = await asyncio.open_unix_connection(address)
+            version = rpc.UnixTransport.VERSION
+        else:
+            raise Exception("Unknown transport: " + transport)
+        t = cls(reader, writer, max_frame_size)
+        try:
+            await t.exchange_version(version)
+        except BaseException:
+            t.close()
+            raise
+        return t
+
+    async def exchange_version(self, version):
+        try:
+            bl = await self.reader.readexactly(1)
+            n = int.from_bytes(bl, byteorder='little')
+            if n > 127:
+                raise Error("Invalid version length")
+            remote_version = await self.reader.readexactly(n)
+        except asyncio.IncompleteReadError:
+            raise EOFError from None
+        if remote_version[-1] != 0x0a:
+            raise Error("Invalid version message")
+
+        if remote_version[0:-1] != version.encode():
+            raise Error(f"Unsupported version: {repr(remote_version[0:-1])} expected {version.encode()}")
+
+        self.writer.write(bl + remote_version)
+        await self.writer.drain()
+
+    def send_msgs(self, messages):
+        buffers = []
+        for serialized in messages:
+            buffers.append(len(serialized).to_bytes(length=8, byteorder='little'))
+            buffers.append(serialized)
+        self.writer.writelines(buffers)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    async def recv_msg(self):
+        try:
+            n = int.from_bytes(await self.reader.readexactly(8), 'little')
+            if n > self.max_frame_size:
+                raise Error(f"Message of {n} bytes exceeds max_frame_size of {self.max_frame_size} bytes")
+            return await self.reader.readexactly(n)
+        except asyncio.IncompleteReadError:
+            raise EOFError from None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class RpcConnection(rpc.Connection):
+    """
+    Reuses the request builders of :py:class:`polypheny.rpc.Connection`.
+    Every request is pipelined, a background task hands the responses
+    to the futures of their requests.  Methods called with ``wait=True``
+    return a coroutine, with ``wait=False`` an :py:class:`asyncio.Future`.
+    """
+
+    def __init__(self, transport):
+        self.con = transport
+        self.ids = itertools.count(1)
+        self.pending = {}  # Request id -> (Future, field)
+        self.outbox = []
+        self.broken = None
+        self.receiver = asyncio.get_running_loop().create_task(self.receive())
+
+    @classmethod
+    async def open(cls, address, transport, kwargs):
+        return cls(await StreamTransport.open(address, transport, kwargs.get('max_frame_size')))
+
+    async def close(self):
+        if self.con is None:
+            return
+        try:
+            await self.disconnect()
+        except Exception:
+            pass
+
+        self.con.close()
+        self.con = None
+        self.receiver.cancel()
+        self.fail(Error("Connection is closed"))
+
+    def submit(self, msg, field=None, flush=True):
+        if self.broken is not None:
+            raise Error("Connection is unusable") from self.broken
+        future = asyncio.get_running_loop().create_future()
+        self.pending[msg.id] = (future, field)
+        self.outbox.append(msg.SerializeToString())
+        if flush:
+            self.flush()
+        return future
+
+    def flush(self):
+        msgs, self.outbox = self.outbox, []
+        self.con.send_msgs(msgs)
+
+    async def wait(self, future):
+        await self.con.drain()
+        return await future
+
+    def request(self, msg, field, wait):
+        future = self.submit(msg, field)
+        if wait:
+            return self.wait(future)
+        return future
+
+    async def receive(self):
+        try:
+            while True:
+                r = protointerface_pb2.Response()
+                r.ParseFromString(await self.con.recv_msg())
+                self.dispatch(r)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            self.fail(e)
+
+    def dispatch(self, r):
+        entry = self.pending.get(r.id)
+        if entry is None:
+            self.fail(Error(f"Received response for unknown request {r.id}"))
+            return
+        future, field = entry
+        if r.WhichOneof('type') == 'error_response':
+            if not future.done():
+                future.set_exception(Error(r.error_response.message))
+        elif not r.last:
+            return
+        elif not future.done():
+            future.set_result(r if field is None else getattr(r, field))
+        del self.pending[r.id]
+
+    def fail(self, e):
+        if self.broken is None:
+            self.broken = e
+        for future, _ in self.pending.values():
+            if not future.done():
+                future.set_exception(e)
+        self.pending.clear()
+        self.outbox.clear()
+
+
+async def connect(address: Union[tuple[str, int], str] = None, *, username: str = None, password: str = None,
+                  transport: str = None, **kwargs) -> 'Connection':
+    """
+    Like :py:func:`polypheny.connect`, but returns a
+    :py:class:`polypheny.aio.Connection`.
+    """
+    if address is None and transport is None and username is None and password is None:
+        transport = 'unix'
+    elif address is None or transport is None:
+        raise Error("Address and transport must be given")
+
+    try:
+        con = await RpcConnection.open(address, transport, kwargs)
+    except ConnectionRefusedError:
+        raise Error("Connection refused") from None
+
+    try:
+        resp = await con.connect(username, password, bool(kwargs.get('autocommit', False)))
+        if not resp.is_compatible:
+            raise Error(
+                f"Client ({rpc.POLYPHENY_API_MAJOR}.{rpc.POLYPHENY_API_MINOR}) is incompatible with Server version ({resp.major_api_version}.{resp.minor_api_version})")
+    except Exception as e:
+        # Close without sending the disconnect message
+        con.con.close()
+        con.receiver.cancel()
+        raise Error(str(e))
+
+    return Connection(con, kwargs)
+
+
+class Connection:
+    def __init__(self, con, kwargs):
+        self.cursors = set()
+        self.con = con
+        self.pipelining = kwargs.get('pipelining', False)
+        self.statement_cache = connection.StatementCache(kwargs.get('statement_cache_size', 32))
+        self.row_factory = kwargs.get('row_factory', rows.tuple_row if kwargs.get('tuple_rows') else None)
+        self.document_factory = kwargs.get('document_factory')
+        self._autocommit = bool(kwargs.get('autocommit', False))
+        self.open_batch = None
+
+    @property
+    def autocommit(self) -> bool:
+        """
+        See :py:attr:`polypheny.Connection.autocommit`.  Changing it needs
+        a request, so it is changed with :py:meth:`set_autocommit`.
+        """
+        return self._autocommit
+
+    async def set_autocommit(self, value: bool):
+        """ Turns autocommit on or off, see :py:attr:`autocommit`. """
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        value = bool(value)
+        if value == self._autocommit:
+            return
+        if self.open_batch is not None:
+            try:
+                await self.open_batch.flush()
+            finally:
+                self.open_batch.end()
+        committed = self.con.commit(wait=False) if value else None
+        await self.con.update_connection_properties(auto_commit=value)
+        self._autocommit = value
+        if committed is not None:
+            await committed
+
+    def cursor(self):
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        cur = Cursor(self)
+        self.cursors.add(cur)
+        return cur
+
+    async def commit(self):
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            await self.open_batch.flush()
+        await self.con.commit()
+
+    async def rollback(self):
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            self.open_batch.end()
+        await self.con.rollback()
+
+    def batch(self, namespace: str = None) -> 'Batch':
+        """
+        See :py:meth:`polypheny.Connection.batch`.  The batch is used
+        with ``async with``.
+        """
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            raise ProgrammingError('A batch is already open')
+        self.open_batch = Batch(self, namespace)
+        return self.open_batch
+
+    async def write_table(self, table_name: str, data, namespace: str = None, *,
+                          chunk_rows: int = connection.WRITE_TABLE_CHUNK_ROWS) -> int:
+        """
+        See :py:meth:`polypheny.Connection.write_table`.
+        """
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if chunk_rows < 1:
+            raise ProgrammingError("chunk_rows must be positive")
+        names, values, encoders = columns.table_columns(data)
+        if len(names) == 0:
+            raise ProgrammingError("No columns to write")
+        query = f'INSERT INTO {table_name}({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+
+        cur = self.cursor()
+        try:
+            statement_id = (await cur.prepare('sql', query, namespace, True)).statement_id
+            try:
+                return await run(self.con, connection.write_chunks(self.con, statement_id, values, encoders, chunk_rows))
+            finally:
+                cur.release_statement(statement_id)
+        finally:
+            await cur.close()
+
+    async def close(self):
+        if self.con is None:
+            assert len(self.cursors) == 0
+            return
+
+        for cur in list(self.cursors):  # self.cursors is materialized because cur.close modifies it
+            await cur.close()
+        assert len(self.cursors) == 0
+        if self.open_batch is not None:
+            self.open_batch.end()
+
+        try:
+            if self.con.broken is None and not self._autocommit:
+                await self.rollback()
+        finally:
+            await self.con.close()
+            self.con = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class Batch(connection.Batch):
+    """
+    See :py:class:`polypheny.connection.Batch`.
+    """
+
+    async def flush(self) -> List[int]:
+        """
+        See :py:meth:`polypheny.connection.Batch.flush`.
+        """
+        if self.con is None:
+            raise ProgrammingError('Batch is finished')
+        return await run(self.con.con, self.send())
+
+    def __enter__(self):
+        raise ProgrammingError("Use async with")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        con = self.con
+        if con is None:  # The connection was closed
+            return
+        failed = exc_type is not None
+        try:
+            if not failed:
+                try:
+                    if con.autocommit:
+                        await self.flush()
+                    else:
+                        await con.commit()
+                except Error:
+                    failed = True
+                    raise
+        finally:
+            try:
+                if failed and not con.autocommit and con.con is not None and con.con.broken is None:
+                    await con.rollback()
+            except Error:
+                pass  # Keeps the error that ended the batch
+            finally:
+                self.end()
+
+
+async def run(con, steps):
+    """
+    See :py:func:`polypheny.connection.run`, waits on the
+    :py:class:`RpcConnection` ``con``.
+    """
+    answer = error = None
+    while True:
+        try:
+            pending = steps.send(answer) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            answer, error = await con.wait(pending), None
+        except Exception as e:
+            answer, error = None, e
+
+
+async def fetch_frame(con, statement_id, fetch_size):
+    """
+    See :py:func:`polypheny.connection.fetch_frame`.
+    """
+    if not isinstance(fetch_size, connection.FetchSizeTuner):
+        return await con.fetch(statement_id, fetch_size)
+    size = fetch_size.size
+    start = time.perf_counter()
+    frame = await con.fetch(statement_id, size)
+    fetch_size.observe(size, frame, time.perf_counter() - start)
+    return frame
+
+
+class Prefetcher:
+    """
+    Task based version of :py:class:`polypheny.connection.Prefetcher`.
+    """
+
+    def __init__(self, con, statement_id, fetch_size, decode, depth):
+        self.queue = asyncio.Queue(depth)
+        self.task = asyncio.get_running_loop().create_task(self.run(con, statement_id, fetch_size, decode))
+
+    async def run(self, con, statement_id, fetch_size, decode):
+        try:
+            while True:
+                frame = await fetch_frame(con, statement_id, fetch_size)
+                await self.queue.put((decode(frame), frame.is_last))
+                if frame.is_last:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await self.queue.put(e)
+
+    async def get(self):
+        item = await self.queue.get()
+        if isinstance(item, BaseException):
+            self.queue.put_nowait(item)
+            raise item
+        return item
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class ResultCursor(connection.ResultCursor):
+    def __del__(self):
+        pass  # Closing needs the event loop
+
+    def start_prefetch(self, depth):
+        return Prefetcher(self.con.con, self.statement_id, self.fetch_size, self.decode_frame, depth)
+
+    async def close(self):
+        if self.closed:
+            return
+        assert self.con.con is not None
+        try:
+            if self.prefetcher is not None:
+                await self.prefetcher.stop()
+            if self.con.con.broken is not None:
+                pass  # Nothing to close on a dead connection
+            elif self.released:
+                pass
+            elif self.con.statement_cache.release(self.statement_id):
+                if self.has_results:
+                    self.con.con.close_result(self.statement_id, wait=False)
+            elif self.con.pipelining:
+                self.con.con.close_statement(self.statement_id, wait=False)
+            else:
+                await self.con.con.close_statement(self.statement_id)
+        finally:
+            self.con = None
+            self.closed = True
+            self.rows = []
+
+    async def next(self):
+        """ Returns the next row or document, or ``None`` at the end. """
+        self.check()
+        while self.pos >= len(self.rows):
+            if self.is_last:
+                return None
+            await self.nextframe()
+        row = self.rows[self.pos]
+        self.pos += 1
+        return row
+
+    async def fetch(self, size=None):
+        self.check()
+        results = self.take(size)
+        while (size is None or len(results) < size) and not self.is_last:
+            await self.nextframe()
+            results.extend(self.take(None if size is None else size - len(results)))
+        return results
+
+    async def chunks(self, size=None):
+        self.check()
+        remaining = size
+        while True:
+            rows = self.take(remaining)
+            if len(rows) > 0:
+                yield rows
+                if remaining is not None:
+                    remaining -= len(rows)
+            if remaining == 0 or self.is_last:
+                return
+            await self.nextframe()
+
+    async def nextframe(self):
+        if self.prefetcher is not None:
+            self.rows, self.is_last = await self.prefetcher.get()
+            self.pos = 0
+        else:
+            self.load(await fetch_frame(self.con.con, self.statement_id, self.fetch_size))
+
+
+class Cursor:
+    def __init__(self, con):
+        self.con = con
+        self.result = None
+        #: Row factory from :py:mod:`polypheny.rows` for relational results,
+        #: ``None`` gives lists
+        self.row_factory = con.row_factory
+        #: Document factory from :py:mod:`polypheny.rows` for document
+        #: results, ``None`` gives dicts
+        self.document_factory = con.document_factory
+        self.description = None
+        self.rowcount = -1
+        self.arraysize = 1
+
+    async def reset(self):
+        if self.result is not None:
+            await self.result.close()
+        self.description = None
+        self.rowcount = -1
+        self.arraysize = 1
+        self.result = None
+
+    async def close(self):
+        assert self.con is not None or self.result is None
+        if self.con is not None:
+            if self.result is not None:
+                await self.result.close()
+                self.result = None
+            self.con.cursors.remove(self)
+            self.con = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        n = await self.fetchone()
+        if n is None:
+            raise StopAsyncIteration
+        return n
+
+    async def execute(self, query: str, params: List[Any] = None, *,
+                      fetch_size: Union[int, connection.FetchSizeTuner] = None, prefetch: int = 0):
+        """
+        Executes a SQL query.
+        """
+        return await self.executeany('sql', query, params, fetch_size=fetch_size, prefetch=prefetch)
+
+    async def executemany(self, query: str, params: List[List[Any]], *,
+                          batch_size: int = connection.EXECUTEMANY_BATCH_SIZE):
+        """
+        See :py:meth:`polypheny.Cursor.executemany`.
+        """
+        if self.con is None:
+            raise Error("Cursor is closed")
+
+        await self.reset()
+
+        params = iter(params)
+        first = next(params, None)
+        if first is None:
+            self.rowcount = 0
+            return
+        params = itertools.chain((first,), params)
+        if type(first) == dict:
+            rowcount = 0
+            for param in params:
+                await self.execute(query, param)
+                rowcount += self.rowcount
+            await self.reset()
+            self.rowcount = rowcount
+            return
+
+        statement_id = (await self.prepare('sql', query, None, True)).statement_id
+        try:
+            self.rowcount = 0
+            start = 0
+            for n in itertools.count():
+                batch = list(itertools.islice(params, batch_size))
+                if len(batch) == 0:
+                    break
+                for param in batch:
+                    if type(param) != list and type(param) != tuple:
+                        raise Error("Unexpected type for params " + str(type(param)))
+                try:
+                    r = await self.con.con.execute_indexed_statement_batch(statement_id, batch)
+                except Error as e:
+                    raise type(e)(f"Batch {n} with rows {start} to {start + len(batch) - 1} failed: {e}") from e
+                self.rowcount += sum(r.scalars)
+                start += len(batch)
+        finally:
+            self.release_statement(statement_id)
+
+    async def executescript(self, lang: str, statements: List[str], *, namespace: str = None,
+                            window: int = connection.SCRIPT_WINDOW) -> List[int]:
+        """
+        See :py:meth:`polypheny.Cursor.executescript`.
+        """
+        if self.con is None:
+            raise Error("Cursor is closed")
+        if isinstance(statements, str):
+            raise ProgrammingError("statements must be a list of statements")
+        if window < 1:
+            raise ProgrammingError("window must be at least 1")
+
+        await self.reset()
+
+        rowcounts = []
+        try:
+            await run(self.con.con, connection.script_steps(self.con.con, lang, statements, namespace, rowcounts,
+                                                            window))
+        finally:
+            self.rowcount = sum(count for count in rowcounts if count > 0)
+        return rowcounts
+
+    async def executeany(self, lang: str, query: str, params: List[Any] = None, *,
+                         fetch_size: Union[int, connection.FetchSizeTuner] = None, namespace: str = None,
+                         prefetch: int = 0):
+        """
+        See :py:meth:`polypheny.Cursor.executeany`.  Frames are read
+        ahead by a task instead of a thread.
+        """
+        if self.con is None:
+            raise Error("Cursor is closed")
+
+        await self.reset()
+
+        tuner = fetch_size if isinstance(fetch_size, connection.FetchSizeTuner) else None
+        size = fetch_size if tuner is None else tuner.size
+
+        rpc_con = self.con.con
+        if params is None:  # Unparameterized query
+            r = await rpc_con.execute_unparameterized_statement(lang, query, size, namespace)
+            assert r.HasField("result")
+            statement_id = r.statement_id
+            result = r.result
+        elif type(params) == list or type(params) == tuple:
+            statement_id = (await self.prepare(lang, query, namespace, True)).statement_id
+            try:
+                result = await rpc_con.execute_indexed_statement(statement_id, params, size)
+            except Exception:
+                self.con.statement_cache.remove(rpc_con, statement_id)
+                raise
+        elif type(params) == dict:
+            statement_id = (await self.prepare(lang, query, namespace, False)).statement_id
+            try:
+                result = await rpc_con.execute_named_statement(statement_id, params, size)
+            except Exception:
+                self.con.statement_cache.remove(rpc_con, statement_id)
+                raise
+        else:
+            raise Error("Unexpected type for params " + str(type(params)))
+
+        if result.HasField("frame"):
+            self.rowcount = -1
+            if result.frame.WhichOneof('result') == 'relational_frame':
+                self.description = connection.describe(result.frame.relational_frame)
+            frame = result.frame
+        else:
+            self.rowcount = result.scalar
+            frame = None
+
+        if tuner is not None and frame is not None:
+            tuner.observe(size, frame, None)
+        self.result = ResultCursor(self.con, statement_id, frame, fetch_size, prefetch, self.row_factory,
+                                   self.document_factory)
+        if frame is None:
+            self.result.release()
+
+    async def prepare(self, lang, query, namespace, indexed):
+        cache = self.con.statement_cache
+        key = (lang, query, namespace, indexed)
+        signature = cache.acquire(key)
+        if signature is None:
+            if indexed:
+                signature = await self.con.con.prepare_indexed_statement(lang, query, namespace)
+            else:
+                signature = await self.con.con.prepare_named_statement(lang, query, namespace)
+            cache.add(self.con.con, key, signature)
+        return signature
+
+    def release_statement(self, statement_id):
+        if not self.con.statement_cache.release(statement_id):
+            self.con.con.close_statement(statement_id, wait=False)
+
+    def check_result(self):
+        if self.con is None:
+            raise ProgrammingError("Cursor is closed")
+
+        if self.result is None:
+            raise ProgrammingError("No statement was yet executed")
+
+    async def fetchone(self):
+        self.check_result()
+        return await self.result.next()
+
+    async def fetchmany(self, size=None):
+        self.check_result()
+        if size is None:
+            size = self.arraysize
+        return await self.result.fetch(size)
+
+    async def fetchall(self):
+        self.check_result()
+        return await self.result.fetch()
+
+    async def iter_ndjson(self):
+        """
+        See :py:meth:`polypheny.Cursor.iter_ndjson`.
+        """
+        self.check_result()
+        if self.description is not None:
+            raise ProgrammingError("NDJSON can only be fetched from document results")
+        async for documents in self.result.chunks():
+            yield rows.ndjson_lines(documents)
+
+    async def fetch_numpy(self):
+        """
+        See :py:meth:`polypheny.Cursor.fetch_numpy`.
+        """
+        return await self.build_columns(columns.NumpyBuilder, None)
+
+    async def fetchmany_numpy(self, size: int = None):
+        """
+        See :py:meth:`polypheny.Cursor.fetchmany_numpy`.
+        """
+        if size is None:
+            size = self.arraysize
+        return await self.build_columns(columns.NumpyBuilder, size)
+
+    async def iter_arrow_batches(self):
+        """
+        See :py:meth:`polypheny.Cursor.iter_arrow_batches`.
+        """
+        self.check_result()
+        builder = columns.ArrowBuilder(self.description, self.result.column_meta)
+        async for rows in self.result.chunks():
+            yield builder.batch(rows)
+
+    async def fetch_arrow_table(self):
+        """
+        See :py:meth:`polypheny.Cursor.fetch_arrow_table`.
+        """
+        self.check_result()
+        builder = columns.ArrowBuilder(self.description, self.result.column_meta)
+        return builder.table([builder.batch(rows) async for rows in self.result.chunks()])
+
+    async def build_columns(self, builder, size):
+        self.check_result()
+        builder = builder(self.description)
+        async for rows in self.result.chunks(size):
+            builder.add(rows)
+        return builder.result()
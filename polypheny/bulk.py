@@ -0,0 +1,381 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Loads CSV and NDJSON files into Polypheny.  The file is memory mapped
+and parsed one chunk of rows at a time, so only the chunks on the way
+to the server are held in memory, whatever the size of the file.
+
+>>> import polypheny.bulk
+>>> polypheny.bulk.load_file(con, 'fruits.csv', 'fruits')  # doctest: +SKIP
+"""
+
+import codecs
+import csv
+import datetime
+import decimal
+import itertools
+import json
+import mmap
+import os
+from typing import Callable, List
+
+from polypheny import columns as cols
+from polypheny.connection import WRITE_TABLE_WINDOW, pipeline, run
+from polypheny.exceptions import *
+from polypheny.serialize import encode_bool, encode_date, encode_datetime, encode_float, encode_int, encode_str, \
+    encode_time, encode_decimal
+
+FORMATS = ('csv', 'ndjson')
+
+# Rows sent per batch request by load_file
+CHUNK_ROWS = 10000
+
+TRUE = ('true', 't', '1', 'yes', 'y')
+FALSE = ('false', 'f', '0', 'no', 'n')
+
+
+def parse_bool(value):
+    value = value.strip().lower()
+    if value in TRUE:
+        return True
+    if value in FALSE:
+        return False
+    raise ValueError(f"Not a boolean: {value!r}")
+
+
+def parse_decimal(value):
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        raise ValueError(f"Not a decimal: {value!r}") from None
+
+
+def parse_timestamp(value):
+    t = datetime.datetime.fromisoformat(value)
+    if t.tzinfo is None:  # Polypheny timestamps are UTC
+        t = t.replace(tzinfo=datetime.timezone.utc)
+    return t
+
+
+# Polypheny type -> (function parsing a CSV field, encoder), other types are sent as strings
+CSV_TYPES = {
+    'BOOLEAN': (parse_bool, encode_bool),
+    'TINYINT': (int, encode_int),
+    'SMALLINT': (int, encode_int),
+    'INTEGER': (int, encode_int),
+    'BIGINT': (int, encode_int),
+    'REAL': (float, encode_float),
+    'FLOAT': (float, encode_float),
+    'DOUBLE': (float, encode_float),
+    'DECIMAL': (parse_decimal, encode_decimal),
+    'DATE': (datetime.date.fromisoformat, encode_date),
+    'TIME': (datetime.time.fromisoformat, encode_time),
+    'TIMESTAMP': (parse_timestamp, encode_datetime),
+}
+
+# Polypheny type -> function parsing a JSON string, other values are sent as they are
+JSON_TYPES = {
+    'DECIMAL': parse_decimal,
+    'DATE': datetime.date.fromisoformat,
+    'TIME': datetime.time.fromisoformat,
+    'TIMESTAMP': parse_timestamp,
+}
+
+
+def load_file(con, path: str, table: str, format: str = 'csv', *, namespace: str = None, lang: str = 'sql',
+              columns: List[str] = None, header: bool = True, delimiter: str = ',', null: str = '',
+              encoding: str = 'utf-8', chunk_rows: int = CHUNK_ROWS, offset: int = 0,
+              progress: Callable[[int, int, int], None] = None, commit: bool = False) -> int:
+    """
+    Inserts the rows of the CSV or NDJSON file at ``path`` into the
+    existing ``table`` and returns the number of inserted rows.
+
+    :param format:  ``'csv'`` or ``'ndjson'``, with one JSON object per
+                    line.
+    :param lang:  With ``'mongo'``, the objects of an NDJSON file are
+                  inserted as they are into the collection ``table`` of a
+                  document namespace.  Every line must hold one JSON
+                  object.
+    :param columns:  Names of the columns of the file.  Defaults to the
+                     header line of a CSV file, or to the keys of the
+                     first object of an NDJSON file.
+    :param null:  CSV fields equal to this string are ``NULL``.
+    :param offset:  Byte offset to start at, to resume a load that
+                    failed.
+    :param progress:  Called with the byte offset up to which the file is
+                      loaded, the size of the file and the number of
+                      rows loaded so far, each time the server confirms
+                      a chunk, or with ``commit`` after each commit.
+    :param commit:  Commit after every few chunks, so a failed load can
+                    be resumed.
+
+    The CSV fields are converted to the types of the table columns the
+    server reports for the ``INSERT``.  Temporal values are expected in
+    ISO 8601 format, timestamps without time zone are UTC.
+
+    Chunks of ``chunk_rows`` rows are sent as they are parsed, with
+    several of them on the way at once.  If loading fails, the error has
+    an ``offset`` attribute.  With ``commit``, the transaction is rolled
+    back to the last commit and ``offset`` is where it left off, so
+    calling :py:func:`load_file` again with that ``offset`` continues the
+    load.  Without ``commit``, ``offset`` is the start of the failed
+    chunk, but chunks after it may have been executed as well; call
+    :py:meth:`~polypheny.Connection.rollback` and start over.
+    """
+    if format not in FORMATS:
+        raise ProgrammingError(f"Unknown format {format}, expected one of {FORMATS}")
+    if lang == 'mongo' and format != 'ndjson':
+        raise NotSupportedError("Only NDJSON files can be loaded into collections")
+    if lang not in ('sql', 'mongo'):
+        raise NotSupportedError(f"Loading with {lang} is not supported")
+    if chunk_rows < 1:
+        raise ProgrammingError("chunk_rows must be positive")
+    if con.con is None:
+        raise ProgrammingError('Connection is closed')
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:3] == codecs.BOM_UTF8:
+                mm.seek(3)
+            if lang == 'mongo':
+                return load_collection(con, mm, table, namespace, encoding, chunk_rows, offset, size, progress,
+                                       commit)
+            if format == 'csv':
+                reader = csv.reader(read_lines(mm, encoding), delimiter=delimiter)
+                if header:
+                    names = next(reader, None)
+                    if columns is None:
+                        columns = names
+                offset = max(offset, mm.tell())
+                mm.seek(offset)
+                records = (record for record in reader if record)  # Skips empty lines
+            else:
+                offset = max(offset, mm.tell())
+                mm.seek(offset)
+                if columns is None:
+                    first = next((line for line in read_lines(mm, encoding) if not line.isspace()), None)
+                    if first is None:
+                        return 0
+                    try:
+                        first = json.loads(first)
+                    except ValueError as e:
+                        raise DataError(f"Cannot parse line: {e}") from None
+                    if type(first) != dict:
+                        raise DataError(f"Expected a JSON object, got {first}")
+                    columns = list(first)
+                    mm.seek(offset)  # The first object is loaded as well
+                records = (json.loads(line) for line in read_lines(mm, encoding) if not line.isspace())
+            if not columns:
+                raise ProgrammingError("No columns to load")
+            return load_table(con, mm, table, namespace, format, columns, records, null, chunk_rows, offset, size,
+                              progress, commit)
+
+
+def read_lines(mm, encoding):
+    while True:
+        line = mm.readline()
+        if not line:
+            return
+        yield line.decode(encoding)
+
+
+def chunks(mm, records, chunk_rows):
+    """ Yields lists of ``chunk_rows`` records with the offset after them. """
+    while True:
+        try:
+            chunk = list(itertools.islice(records, chunk_rows))
+        except (ValueError, csv.Error) as e:  # JSONDecodeError is a ValueError
+            raise DataError(f"Cannot parse line: {e}") from None
+        if len(chunk) == 0:
+            return
+        yield chunk, mm.tell()
+
+
+def load_table(con, mm, table, namespace, format, columns, records, null, chunk_rows, offset, size, progress,
+               commit):
+    query = f'INSERT INTO {table}({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    cur = con.cursor()
+    try:
+        signature = cur.prepare('sql', query, namespace, True)
+        try:
+            types = [meta.type_name for meta in signature.parameter_metas]
+            if format == 'csv':
+                convert, encoders = csv_converter(columns, types, null)
+            else:
+                convert, encoders = json_converter(columns, types)
+
+            def submit(chunk):
+                return con.con.execute_indexed_statement_batch(signature.statement_id, convert(chunk), wait=False,
+                                                               encoders=encoders)
+
+            return send(con, chunks(mm, records, chunk_rows), submit, lambda r: sum(r.scalars), offset, size,
+                        progress, commit)
+        finally:
+            cur.release_statement(signature.statement_id)
+    finally:
+        cur.close()
+
+
+def csv_converter(columns, types, null):
+    parsers = []
+    encoders = []
+    for t in types:
+        parse, encoder = CSV_TYPES.get(t, (None, encode_str))
+        parsers.append(parse)
+        encoders.append(cols.nullable(encoder))
+
+    def convert(chunk):
+        for record in chunk:
+            if len(record) != len(columns):
+                raise DataError(f"Expected {len(columns)} fields, got {len(record)}: {record}")
+        converted = []
+        for name, parse, values in zip(columns, parsers, zip(*chunk)):
+            try:
+                if parse is None:
+                    converted.append([None if v == null else v for v in values])
+                else:
+                    converted.append([None if v == null else parse(v) for v in values])
+            except ValueError as e:
+                raise DataError(f"Cannot convert column {name}: {e}") from None
+        return zip(*converted)
+
+    return convert, encoders
+
+
+def json_converter(columns, types):
+    parsers = [JSON_TYPES.get(t) for t in types]
+
+    def convert(chunk):
+        rows = []
+        for record in chunk:
+            if type(record) != dict:
+                raise DataError(f"Expected a JSON object, got {record}")
+            row = [record.get(name) for name in columns]
+            for i, parse in enumerate(parsers):
+                if parse is not None and type(row[i]) == str:
+                    try:
+                        row[i] = parse(row[i])
+                    except ValueError as e:
+                        raise DataError(f"Cannot convert column {columns[i]}: {e}") from None
+            rows.append(row)
+        return rows
+
+    return convert, None
+
+
+def load_collection(con, mm, collection, namespace, encoding, chunk_rows, offset, size, progress, commit):
+    mm.seek(max(offset, mm.tell()))
+    offset = mm.tell()
+
+    def submit(chunk):
+        return con.con.execute_unparameterized_statement('mongo', f'db.{collection}.insertMany([{",".join(chunk)}])',
+                                                         None, namespace, wait=False)
+
+    def count(r):
+        con.con.close_statement(r.statement_id, wait=False)
+        return r.result.scalar
+
+    return send(con, chunks(mm, read_documents(mm, encoding), chunk_rows), submit, count, offset, size, progress,
+                commit)
+
+
+def read_documents(f, encoding):
+    """
+    Yields the JSON objects of the lines of ``f`` dumped again, so only
+    documents and nothing else of the line end up in the query.
+    """
+    while True:
+        start = f.tell()
+        line = f.readline()
+        if not line:
+            return
+        try:
+            line = line.decode(encoding)
+            if line.isspace():
+                continue
+            document = json.loads(line)
+            if type(document) != dict:
+                raise ValueError(f"Expected a JSON object, got {line.strip()}")
+            yield json.dumps(document, allow_nan=False)
+        except ValueError as e:  # JSONDecodeError and UnicodeDecodeError are ValueErrors
+            raise DataError(f"Cannot parse line at byte {start}: {e}") from None
+
+
+def send(con, chunks, submit, count, offset, size, progress, commit):
+    """
+    Submits the chunks with at most ``WRITE_TABLE_WINDOW`` of them
+    waiting for an answer, and returns the sum of ``count`` of the
+    answers.  With ``commit``, the transaction is committed after each
+    window of chunks.
+    """
+    rowcount = 0
+    loaded = offset  # The rows before are confirmed, or committed with commit
+    start = offset  # Of the chunk being read
+    sent = offset  # End of the last chunk sent
+
+    def positions():
+        nonlocal start
+        for chunk, end in chunks:
+            yield start, end, chunk
+            start = end
+
+    def submit_chunk(item):
+        nonlocal sent
+        response = submit(item[2])
+        sent = item[1]
+        return response
+
+    def collect(item, r):
+        nonlocal rowcount, loaded
+        rowcount += count(r)
+        if not commit:
+            loaded = item[1]
+            if progress is not None:
+                progress(loaded, size, rowcount)
+
+    def failed(e, start):
+        if commit:
+            start = loaded
+            if con.con.broken is None:
+                con.rollback()
+        error = type(e)(f"Loading from byte {start} failed: {e}")
+        error.offset = start
+        return error
+
+    items = positions()
+    try:
+        if not commit:
+            run(pipeline(items, submit_chunk, collect, WRITE_TABLE_WINDOW, lambda item, e: failed(e, item[0])))
+            return rowcount
+        while True:
+            end = sent
+            run(pipeline(itertools.islice(items, WRITE_TABLE_WINDOW), submit_chunk, collect, WRITE_TABLE_WINDOW,
+                         lambda item, e: failed(e, item[0])))
+            if sent == end:
+                return rowcount
+            try:
+                con.commit()
+            except Error as e:
+                raise failed(e, loaded) from e
+            loaded = sent
+            if progress is not None:
+                progress(loaded, size, rowcount)
+    except Error as e:
+        if getattr(e, 'offset', None) is not None:
+            raise
+        raise failed(e, start) from None  # Reading or converting a chunk failed
@@ -0,0 +1,397 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Builds NumPy and Arrow columns from relational results, one frame at a
+time, so the rows of a whole result never exist as Python lists at
+once.  For writing, it splits DataFrames, Arrow tables and NumPy arrays
+into columns with one encoder each.
+"""
+
+import json
+from collections.abc import Sequence
+
+from org.polypheny.prism import value_pb2
+from polypheny.exceptions import *
+from polypheny.serialize import ENCODERS, encode_bool, encode_bytes, encode_float, encode_int, encode_str, py2proto, \
+    encode_decimal
+
+# Polypheny type -> NumPy dtype, all other types become object arrays
+NUMPY_TYPES = {
+    'BOOLEAN': 'bool',
+    'TINYINT': 'int8',
+    'SMALLINT': 'int16',
+    'INTEGER': 'int32',
+    'BIGINT': 'int64',
+    'REAL': 'float32',
+    'FLOAT': 'float64',
+    'DOUBLE': 'float64',
+    'DATE': 'datetime64[ms]',
+    'TIME': 'timedelta64[ms]',
+    'TIMESTAMP': 'datetime64[ms]',
+}
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise NotSupportedError("NumPy is not installed, install it with pip install polypheny[numpy]") from None
+    return numpy
+
+
+def time_to_millis(t):
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1000 + t.microsecond // 1000
+
+
+def check_relational(description):
+    if description is None:
+        raise ProgrammingError("Columns can only be fetched from relational results")
+
+
+def check_rows(rows):
+    if len(rows) > 0 and not isinstance(rows[0], Sequence):
+        raise ProgrammingError(f"Columns cannot be built from rows of type {type(rows[0]).__name__}, "
+                               f"use a row factory that returns sequences")
+
+
+class NumpyBuilder:
+    """
+    Collects the rows of a relational result as NumPy arrays.  Columns
+    that can be ``NULL`` become :py:class:`numpy.ma.MaskedArray`, with
+    the ``NULL`` values masked.  The rows are the ones the result cursor
+    already decoded, every cell is a Python object before it goes into
+    an array.
+    """
+
+    def __init__(self, description):
+        check_relational(description)
+        self.np = import_numpy()
+        self.description = description
+        self.parts = [[] for _ in description]
+
+    def add(self, rows):
+        """ Converts a chunk of rows and keeps the arrays of each column. """
+        check_rows(rows)
+        for part, column, values in zip(self.parts, self.description, zip(*rows)):
+            part.append(self.convert(list(values), column[1], column[7]))
+
+    def convert(self, values, type_code, nullable):
+        np = self.np
+        dtype = NUMPY_TYPES.get(type_code, object)
+        mask = None
+        if nullable:
+            mask = np.fromiter((v is None for v in values), bool, len(values))
+            if mask.any() and dtype != object and not dtype.startswith(('datetime64', 'timedelta64')):
+                values = [0 if v is None else v for v in values]
+
+        if type_code == 'TIMESTAMP':
+            # Polypheny timestamps are UTC, NumPy has no timezones
+            values = [None if v is None else v.replace(tzinfo=None) for v in values]
+        elif type_code == 'TIME':
+            values = [None if v is None else time_to_millis(v) for v in values]
+
+        if dtype == object:
+            array = np.empty(len(values), object)
+            array[:] = values  # Keeps lists as elements instead of a further dimension
+        else:
+            array = np.array(values, dtype)
+        if mask is not None:
+            return np.ma.MaskedArray(array, mask)
+        return array
+
+    def arrays(self):
+        """ Returns the arrays in the order of the columns. """
+        np = self.np
+        arrays = []
+        for part, column in zip(self.parts, self.description):
+            nullable = column[7]
+            if len(part) == 0:
+                array = self.convert([], column[1], nullable)
+            elif len(part) == 1:
+                array = part[0]
+            elif nullable:
+                array = np.ma.concatenate(part)
+            else:
+                array = np.concatenate(part)
+            arrays.append(array)
+        return arrays
+
+    def result(self):
+        """
+        Returns a dict of column name to array.  Raises
+        :py:class:`~polypheny.ProgrammingError` when two columns have
+        the same name.
+        """
+        names = [column[0] for column in self.description]
+        for i, name in enumerate(names):
+            if name in names[:i]:
+                raise ProgrammingError(f"Duplicate column name {name!r}, give the columns distinct names with AS")
+        return dict(zip(names, self.arrays()))
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise NotSupportedError("PyArrow is not installed, install it with pip install polypheny[arrow]") from None
+    return pyarrow
+
+
+def arrow_type(pa, type_code, precision, scale, type_meta=None):
+    """
+    Returns the Arrow type for a column, ``None`` for types without an
+    Arrow equivalent.  The element type of arrays comes from
+    ``type_meta``, the ``TypeMeta`` the server sent for the column.
+    """
+    if type_code == 'ARRAY':
+        if type_meta is None or not type_meta.HasField('array_meta'):
+            return None
+        element = type_meta.array_meta.element_type
+        element_code = value_pb2.ProtoPolyType.Name(element.proto_value_type)
+        if element_code == 'INTERVAL':
+            return None
+        t = arrow_type(pa, element_code, None, None, element)
+        return None if t is None else pa.list_(t)
+    if type_code == 'DECIMAL':
+        if precision is None or precision <= 0:
+            return pa.decimal128(38, scale or 0)
+        if precision > 38:
+            return pa.decimal256(precision, scale or 0)
+        return pa.decimal128(precision, scale or 0)
+    t = ARROW_TYPES.get(type_code)
+    return t(pa) if t is not None else None
+
+
+# Polypheny type -> function returning the Arrow type, other types become JSON text
+ARROW_TYPES = {
+    'BOOLEAN': lambda pa: pa.bool_(),
+    'TINYINT': lambda pa: pa.int8(),
+    'SMALLINT': lambda pa: pa.int16(),
+    'INTEGER': lambda pa: pa.int32(),
+    'BIGINT': lambda pa: pa.int64(),
+    'REAL': lambda pa: pa.float32(),
+    'FLOAT': lambda pa: pa.float64(),
+    'DOUBLE': lambda pa: pa.float64(),
+    'DATE': lambda pa: pa.date32(),
+    'TIME': lambda pa: pa.time32('ms'),
+    'TIMESTAMP': lambda pa: pa.timestamp('ms', tz='UTC'),
+    'INTERVAL': lambda pa: pa.month_day_nano_interval(),
+    'CHAR': lambda pa: pa.string(),
+    'VARCHAR': lambda pa: pa.string(),
+    'TEXT': lambda pa: pa.string(),
+    'BINARY': lambda pa: pa.binary(),
+    'VARBINARY': lambda pa: pa.binary(),
+    'AUDIO': lambda pa: pa.binary(),
+    'FILE': lambda pa: pa.binary(),
+    'IMAGE': lambda pa: pa.binary(),
+    'VIDEO': lambda pa: pa.binary(),
+    'NULL': lambda pa: pa.null(),
+}
+
+
+def json_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
+class ArrowBuilder:
+    """
+    Turns chunks of rows of a relational result into
+    :py:class:`pyarrow.RecordBatch` objects with one schema.  The Arrow
+    types come from the column metadata, ``column_meta`` are the
+    ``ColumnMeta`` messages of the result for the element type of
+    arrays.  Values of types without an Arrow equivalent, like
+    documents, become JSON text.
+    """
+
+    def __init__(self, description, column_meta=None):
+        check_relational(description)
+        self.pa = import_pyarrow()
+        self.description = description
+        if column_meta is None:
+            column_meta = [None] * len(description)
+        types = [arrow_type(self.pa, column[1], column[5], column[6], None if meta is None else meta.type_meta)
+                 for column, meta in zip(description, column_meta)]
+        self.as_json = [t is None for t in types]
+        self.types = [self.pa.string() if t is None else t for t in types]
+
+    def schema(self):
+        pa = self.pa
+        return pa.schema([pa.field(column[0], t, nullable=column[7])
+                          for column, t in zip(self.description, self.types)])
+
+    def batch(self, rows):
+        pa = self.pa
+        check_rows(rows)
+        arrays = []
+        for i, (column, values) in enumerate(zip(self.description, zip(*rows))):
+            if column[1] == 'INTERVAL':
+                values = [None if v is None else (v.months, 0, v.milliseconds * 1000000) for v in values]
+            elif self.as_json[i]:
+                values = list(map(json_text, values))
+            arrays.append(pa.array(values, self.types[i]))
+        if len(arrays) < len(self.description):  # No rows
+            arrays = [pa.array([], t) for t in self.types]
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema())
+
+    def table(self, batches):
+        return self.pa.Table.from_batches(batches, schema=self.schema())
+
+
+def encode_millis(value, v):
+    v.timestamp.timestamp = value
+
+
+def encode_days(value, v):
+    v.date.date = value
+
+
+def nullable(encoder):
+    def encode(value, v):
+        if value is None:
+            v.null.SetInParent()
+        else:
+            encoder(value, v)
+
+    return encode
+
+
+def object_column(values):
+    """
+    Returns the values of a column of Python objects with one encoder
+    for all of them.  When the values other than ``None`` are all of one
+    type, its encoder is picked once, otherwise every value goes through
+    :py:func:`~polypheny.serialize.py2proto`.
+    """
+    types = set(map(type, values))
+    nulls = type(None) in types
+    types.discard(type(None))
+    if len(types) == 1:
+        encoder = ENCODERS.get(types.pop())
+        if encoder is not None:
+            return values, nullable(encoder) if nulls else encoder
+    return values, py2proto
+
+
+def numpy_column(np, array, mask=None):
+    """
+    Returns the values of a NumPy array as a list of Python values and
+    the encoder for all of them.  Masked entries become ``None``.
+    """
+    if isinstance(array, np.ma.MaskedArray):
+        mask = np.ma.getmaskarray(array)
+        array = array.data
+    kind = array.dtype.kind
+    if kind == 'b':
+        encoder = encode_bool
+    elif kind in 'iu':
+        encoder = encode_int
+    elif kind == 'f':
+        encoder = encode_float
+    elif kind == 'M':
+        if mask is None:
+            mask = np.isnat(array)
+        array = array.astype('datetime64[ms]').astype('int64')
+        encoder = encode_millis
+    elif kind == 'U':
+        encoder = encode_str
+    elif kind == 'S':
+        encoder = encode_bytes
+    else:
+        encoder = None  # Picked from the values
+    values = array.tolist()
+    if mask is not None and mask.any():
+        values = [None if m else v for v, m in zip(values, mask.tolist())]
+        if encoder is not None:
+            encoder = nullable(encoder)
+    if encoder is None:
+        return object_column(values)
+    return values, encoder
+
+
+def pandas_column(np, series):
+    import pandas.api.types as types
+    mask = series.isna().to_numpy()
+    dtype = series.dtype
+    if types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        array = series.to_numpy('datetime64[ms]')
+    elif types.is_bool_dtype(dtype):
+        array = series.to_numpy(bool, na_value=False)
+    elif types.is_integer_dtype(dtype):
+        array = series.to_numpy('int64', na_value=0)
+    elif types.is_float_dtype(dtype):
+        array = series.to_numpy('float64', na_value=0.0)
+    else:
+        array = series.to_numpy(object, na_value=None)
+    return numpy_column(np, array, mask)
+
+
+def arrow_column(pa, array):
+    t = array.type
+    if pa.types.is_timestamp(t):
+        values, encoder = array.cast(pa.timestamp('ms', tz=t.tz), safe=False).cast(pa.int64()).to_pylist(), encode_millis
+    elif pa.types.is_date32(t):
+        values, encoder = array.cast(pa.int32()).to_pylist(), encode_days
+    elif pa.types.is_boolean(t):
+        values, encoder = array.to_pylist(), encode_bool
+    elif pa.types.is_integer(t):
+        values, encoder = array.to_pylist(), encode_int
+    elif pa.types.is_floating(t):
+        values, encoder = array.to_pylist(), encode_float
+    elif pa.types.is_string(t) or pa.types.is_large_string(t):
+        values, encoder = array.to_pylist(), encode_str
+    elif pa.types.is_binary(t) or pa.types.is_large_binary(t):
+        values, encoder = array.to_pylist(), encode_bytes
+    elif pa.types.is_decimal(t):
+        values, encoder = array.to_pylist(), encode_decimal
+    else:
+        return object_column(array.to_pylist())
+    if array.null_count > 0:
+        encoder = nullable(encoder)
+    return values, encoder
+
+
+def table_columns(data):
+    """
+    Splits a :py:class:`pandas.DataFrame`, a :py:class:`pyarrow.Table`
+    or a :py:class:`dict` of NumPy arrays or lists into column names,
+    lists of values and one encoder for each column.
+    """
+    module = type(data).__module__
+    if module.startswith('pandas'):
+        np = import_numpy()
+        names = [str(name) for name in data.columns]
+        converted = [pandas_column(np, data[name]) for name in data.columns]
+    elif module.startswith('pyarrow'):
+        pa = import_pyarrow()
+        names = list(data.schema.names)
+        converted = [arrow_column(pa, data.column(i)) for i in range(len(names))]
+    elif isinstance(data, dict):
+        names = [str(name) for name in data]
+        converted = []
+        for values in data.values():
+            if type(values).__module__.startswith('numpy'):
+                converted.append(numpy_column(import_numpy(), values))
+            else:
+                converted.append(object_column(list(values)))
+    else:
+        raise ProgrammingError(f"Cannot write data of type {type(data)}")
+    lengths = {len(values) for values, _ in converted}
+    if len(lengths) > 1:
+        raise ProgrammingError("All columns must have the same length")
+    return names, [values for values, _ in converted], [encoder for _, encoder in converted]
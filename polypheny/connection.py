@@ -12,18 +12,359 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Any
+import collections
+import itertools
+import queue
+import threading
+import time
+from typing import List, Any, Union
 
-from org.polypheny.prism import relational_frame_pb2
+from polypheny import columns
+from polypheny import rows
 from polypheny import rpc
 from polypheny.exceptions import *
 from polypheny.serialize import *
 
 
+def type_code(column):
+    """
+    Returns the name of the Polypheny type of ``column``, like
+    ``'VARCHAR'``, or ``None`` when the server did not send it.
+    """
+    t = column.type_meta.proto_value_type
+    if t == value_pb2.ProtoPolyType.UNSPECIFIED:
+        return None
+    return value_pb2.ProtoPolyType.Name(t)
+
+
+def describe(relframe):
+    """
+    Returns the PEP 249 ``description`` for the columns of ``relframe``.
+    """
+    description = []
+    for column in relframe.column_meta:
+        description.append(
+            (column.column_label, type_code(column), None, None, None, column.precision, column.scale,
+             column.is_nullable))
+    return description
+
+
+def decode_rows(rows):
+    """
+    Converts all rows of a relational frame into lists of Python values.
+    """
+    p = proto2py
+    return [[p(value) for value in row.values] for row in rows]
+
+
+# Polypheny type -> ProtoValue field the server sets for its values.
+# Types that are missing here are decoded with proto2py.
+VALUE_FIELDS = {
+    'BOOLEAN': 'boolean',
+    'TINYINT': 'integer',
+    'SMALLINT': 'integer',
+    'INTEGER': 'integer',
+    'BIGINT': 'long',
+    'DECIMAL': 'big_decimal',
+    'DOUBLE': 'double',
+    'DATE': 'date',
+    'TIME': 'time',
+    'TIMESTAMP': 'timestamp',
+    'INTERVAL': 'interval',
+    'CHAR': 'string',
+    'VARCHAR': 'string',
+    'TEXT': 'string',
+    'BINARY': 'binary',
+    'VARBINARY': 'binary',
+    'ARRAY': 'list',
+}
+
+
+class RowDecoder:
+    """
+    Decodes the rows of a relational result with one decoder per
+    column, picked once from the column metadata.  Nullable columns
+    compare the field set in each value with the expected one and use
+    :py:func:`proto2py` for anything else.  Columns that cannot be
+    ``NULL`` read the expected field right away.  Only when that gives
+    the default of the field, which is also what an unset field reads
+    as, they check which field is set.
+    """
+
+    def __init__(self, column_meta):
+        self.fields = [VALUE_FIELDS.get(type_code(column)) for column in column_meta]
+        self.nullable = [column.is_nullable for column in column_meta]
+        self.decoders = tuple(map(self.compile, self.fields, self.nullable))
+
+    @staticmethod
+    def compile(field, nullable):
+        if field is None:
+            return proto2py
+        decoder = DECODERS[field]
+        if not nullable:
+            default = decoder(value_pb2.ProtoValue())
+
+            def decode_not_null(value):
+                v = decoder(value)
+                if v == default and value.WhichOneof('value') != field:
+                    return proto2py(value)
+                return v
+
+            return decode_not_null
+
+        def decode_nullable(value):
+            if value.WhichOneof('value') == field:
+                return decoder(value)
+            return proto2py(value)
+
+        return decode_nullable
+
+    def check(self, row):
+        if len(row.values) > len(self.fields):
+            # More values than columns, give up on the fast path
+            self.fields = [None] * len(row.values)
+            self.nullable = [True] * len(row.values)
+            self.decoders = (proto2py,) * len(row.values)
+
+    def __call__(self, frame):
+        rows = frame.relational_frame.rows
+        if len(rows) == 0:
+            return []
+        self.check(rows[0])
+        decoders = self.decoders
+        return [[d(value) for d, value in zip(decoders, row.values)] for row in rows]
+
+
+def decode_documents(frame):
+    """
+    Converts all documents of a document frame into dicts.
+    """
+    return [decode_nested({}, document.entries) for document in frame.document_frame.documents]
+
+
+# Parameter sets sent per batch request by Cursor.executemany
+EXECUTEMANY_BATCH_SIZE = 1000
+
+# Rows sent per batch request by Connection.write_table
+WRITE_TABLE_CHUNK_ROWS = 10000
+# Batch requests of Connection.write_table sent before waiting for the oldest
+WRITE_TABLE_WINDOW = 4
+
+# Statements of Cursor.executescript sent before waiting for the oldest
+SCRIPT_WINDOW = 32
+
+
+def pipeline(items, submit, collect, window, failed=None, discard=None):
+    """
+    Sends a request with ``submit(item)`` for each of ``items`` and
+    passes the answers in order to ``collect(item, answer)``, with at
+    most ``window`` requests waiting for an answer.
+
+    This is a generator that yields each pending answer it needs and
+    expects the answer or its error back, so the same steps run with
+    :py:func:`run` and :py:func:`polypheny.aio.run`.  When a request
+    fails, ``failed(item, error)`` returns the error to raise instead,
+    and no further requests are sent.  An error while submitting is
+    raised after the answers before it, which may have failed as well.
+    After an error, the answers still on the way are collected and
+    passed to ``discard(item, answer)``.
+    """
+    pending = collections.deque()  # (item, pending answer)
+
+    def take():
+        item, response = pending.popleft()
+        try:
+            answer = yield response
+        except Error as e:
+            if failed is None:
+                raise
+            raise failed(item, e) from e
+        collect(item, answer)
+
+    try:
+        items = iter(items)
+        while True:
+            try:
+                item = next(items)
+                response = submit(item)
+            except StopIteration:
+                break
+            except Error:
+                while pending:
+                    yield from take()
+                raise
+            pending.append((item, response))
+            if len(pending) >= window:
+                yield from take()
+        while pending:
+            yield from take()
+    except Exception:
+        # Collect the answers still on the way after an error
+        for item, response in pending:
+            try:
+                answer = yield response
+            except Error:
+                continue
+            if discard is not None:
+                discard(item, answer)
+        raise
+
+
+def run(steps):
+    """
+    Runs a generator like :py:func:`pipeline`, waiting for each pending
+    answer it yields, and returns what it returns.
+    """
+    answer = error = None
+    while True:
+        try:
+            pending = steps.send(answer) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            answer, error = pending.result(), None
+        except Exception as e:
+            answer, error = None, e
+
+
+def write_chunks(con, statement_id, values, encoders, chunk_rows):
+    """
+    Steps of :py:meth:`Connection.write_table` sending the rows in
+    batches of ``chunk_rows``.  Returns the number of written rows.
+    """
+    length = len(values[0])
+    rowcount = 0
+
+    def submit(chunk):
+        _, start, end = chunk
+        rows = zip(*[column[start:end] for column in values])
+        return con.execute_indexed_statement_batch(statement_id, rows, wait=False, encoders=encoders)
+
+    def collect(chunk, r):
+        nonlocal rowcount
+        rowcount += sum(r.scalars)
+
+    def failed(chunk, e):
+        n, start, end = chunk
+        return type(e)(f"Chunk {n} with rows {start} to {end - 1} failed: {e}")
+
+    chunks = ((n, start, min(start + chunk_rows, length)) for n, start in enumerate(range(0, length, chunk_rows)))
+    yield from pipeline(chunks, submit, collect, WRITE_TABLE_WINDOW, failed)
+    return rowcount
+
+
+def script_steps(con, lang, statements, namespace, rowcounts, window=SCRIPT_WINDOW):
+    """
+    Steps of :py:meth:`Cursor.executescript`, appending the update
+    count of each statement to ``rowcounts``.
+    """
+
+    def submit(item):
+        return con.execute_unparameterized_statement(lang, item[1], None, namespace, wait=False)
+
+    def collect(item, r):
+        con.close_statement(r.statement_id, wait=False)
+        rowcounts.append(-1 if r.result.HasField('frame') else r.result.scalar)
+
+    def failed(item, e):
+        error = type(e)(f"Statement {item[0]} failed: {e}")
+        error.index = item[0]
+        return error
+
+    def discard(item, r):
+        con.close_statement(r.statement_id, wait=False)
+
+    yield from pipeline(enumerate(statements), submit, collect, window, failed, discard)
+
+
+class StatementCache:
+    """
+    LRU cache of the prepared statements of a connection, keyed by
+    language, query, namespace and parameter style.  A cached statement
+    is handed out only while no open result of it exists.
+
+    :ivar hits:  Number of executions that reused a prepared statement.
+    :ivar misses:  Number of executions that had to prepare a statement.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.statements = collections.OrderedDict()  # key -> PreparedStatementSignature
+        self.keys = {}  # statement id -> key
+        self.in_use = set()  # statement ids with an open result
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.statements)
+
+    def acquire(self, key):
+        signature = self.statements.get(key)
+        if signature is None or signature.statement_id in self.in_use:
+            self.misses += 1
+            return None
+        self.statements.move_to_end(key)
+        self.in_use.add(signature.statement_id)
+        self.hits += 1
+        return signature
+
+    def add(self, con, key, signature):
+        """
+        Caches ``signature`` and marks it as used.  Returns ``False`` if
+        it was not cached.  Evicted statements are closed on the server
+        unless they are in use, then :py:meth:`release` tells the owner
+        to close them.
+        """
+        if self.size <= 0 or key in self.statements:
+            return False
+        self.statements[key] = signature
+        self.keys[signature.statement_id] = key
+        self.in_use.add(signature.statement_id)
+        while len(self.statements) > self.size:
+            _, evicted = self.statements.popitem(last=False)
+            del self.keys[evicted.statement_id]
+            if evicted.statement_id not in self.in_use:
+                con.close_statement(evicted.statement_id, wait=False)
+        return True
+
+    def release(self, statement_id):
+        """
+        Marks the statement as unused.  Returns ``True`` if it is still
+        cached, otherwise the caller has to close it.
+        """
+        self.in_use.discard(statement_id)
+        return statement_id in self.keys
+
+    def remove(self, con, statement_id):
+        """
+        Drops a statement whose execution failed and closes it on the
+        server.  After a schema change the statement might be stale, so
+        it must not be handed out again.
+        """
+        self.in_use.discard(statement_id)
+        key = self.keys.pop(statement_id, None)
+        if key is not None:
+            del self.statements[key]
+        if con.broken is None:
+            con.close_statement(statement_id, wait=False)
+
+
 class Connection:
     def __init__(self, address, username, password, transport, kwargs):
         self.cursors = set()
         self.con = None  # Needed so destructor works
+        # Send requests whose answer is not needed right away together
+        # with the next one instead of waiting for them
+        self.pipelining = kwargs.get('pipelining', False)
+        #: The :py:class:`StatementCache` of this connection
+        self.statement_cache = StatementCache(kwargs.get('statement_cache_size', 32))
+        #: Row factory from :py:mod:`polypheny.rows` new cursors start with
+        self.row_factory = kwargs.get('row_factory', rows.tuple_row if kwargs.get('tuple_rows') else None)
+        #: Document factory from :py:mod:`polypheny.rows` new cursors start with
+        self.document_factory = kwargs.get('document_factory')
+        self._autocommit = bool(kwargs.get('autocommit', False))
+        #: The :py:class:`Batch` of :py:meth:`batch` until it ends
+        self.open_batch = None
 
         try:
             self.con = rpc.Connection(address, transport, kwargs)
@@ -31,7 +372,7 @@ class Connection:
             raise Error("Connection refused") from None
 
         try:
-            resp = self.con.connect(username, password, False)
+            resp = self.con.connect(username, password, self._autocommit)
             if not resp.is_compatible:
                 raise Error(
                     f"Client ({rpc.POLYPHENY_API_MAJOR}.{rpc.POLYPHENY_API_MINOR}) is incompatible with Server version ({resp.major_api_version}.{resp.minor_api_version})")
@@ -49,8 +390,40 @@ class Connection:
         self.cursors.add(cur)
         return cur
 
+    @property
+    def autocommit(self) -> bool:
+        """
+        ``True`` when every statement is committed by the server as soon
+        as it is executed, so writes need no :py:meth:`commit`.  Turning
+        autocommit on commits the open transaction first.  Changing it
+        sends and ends an open :py:meth:`batch`.  In autocommit mode,
+        :py:meth:`close` does not roll back.
+        """
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value: bool):
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        value = bool(value)
+        if value == self._autocommit:
+            return
+        if self.open_batch is not None:
+            try:
+                self.open_batch.flush()
+            finally:
+                self.open_batch.end()
+        committed = self.con.commit(wait=False) if value else None
+        self.con.update_connection_properties(auto_commit=value)
+        self._autocommit = value
+        if committed is not None:
+            committed.result()
+
     def commit(self):
         """
+        Statements queued in an open :py:meth:`batch` are sent first.
+        :py:meth:`rollback` drops them and ends the batch.
+
         .. Note::
 
             Performing a DDL automatically commits the transaction.
@@ -60,6 +433,8 @@ class Connection:
         """
         if self.con is None:
             raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            self.open_batch.flush()
         self.con.commit()
 
     def rollback(self):
@@ -80,8 +455,73 @@ class Connection:
         """
         if self.con is None:
             raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            self.open_batch.end()
         self.con.rollback()
 
+    def batch(self, namespace: str = None) -> 'Batch':
+        """
+        Returns a :py:class:`Batch` that queues SQL statements with
+        indexed parameters instead of executing them.  They are sent when
+        the batch is flushed, at the latest by :py:meth:`commit`.  Used
+        as a context manager, the batch commits at the end of the block,
+        or rolls the transaction back on an exception.
+
+        >>> with con.batch() as batch:  # doctest: +SKIP
+        ...     batch.execute('INSERT INTO fruits(id, name) VALUES (?, ?)', (3, 'Kiwi'))
+        ...     batch.execute('UPDATE fruits SET name = ? WHERE id = ?', ('Lime', 1))
+
+        Consecutive statements with the same query go into one batch
+        request, and all requests are sent without waiting for the ones
+        before.  Statements executed with cursors in the meantime are not
+        queued, so they run before the queued ones.  Only one batch can
+        be open at a time.
+        """
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if self.open_batch is not None:
+            raise ProgrammingError('A batch is already open')
+        self.open_batch = Batch(self, namespace)
+        return self.open_batch
+
+    def write_table(self, table_name: str, data, namespace: str = None, *,
+                    chunk_rows: int = WRITE_TABLE_CHUNK_ROWS) -> int:
+        """
+        Inserts all rows of ``data`` into the existing table
+        ``table_name`` and returns the number of inserted rows.
+
+        ``data`` is a :py:class:`pandas.DataFrame`, a
+        :py:class:`pyarrow.Table` or a :py:class:`dict` of column name to
+        NumPy array or list.  The encoder of each column is picked once
+        from its dtype, and the rows are sent in batches of
+        ``chunk_rows``, with several batches on the way at once.  Table
+        and column names are put into the ``INSERT`` as they are, quote
+        them if needed.  When a batch fails, the error names its rows;
+        the batches before it have been executed, so call
+        :py:meth:`rollback` to undo them.
+
+        >>> con.write_table('fruits', {'id': [1, 2], 'name': ['Apple', 'Pear']})  # doctest: +SKIP
+        2
+        """
+        if self.con is None:
+            raise ProgrammingError('Connection is closed')
+        if chunk_rows < 1:
+            raise ProgrammingError("chunk_rows must be positive")
+        names, values, encoders = columns.table_columns(data)
+        if len(names) == 0:
+            raise ProgrammingError("No columns to write")
+        query = f'INSERT INTO {table_name}({", ".join(names)}) VALUES ({", ".join("?" * len(names))})'
+
+        cur = self.cursor()
+        try:
+            statement_id = cur.prepare('sql', query, namespace, True).statement_id
+            try:
+                return run(write_chunks(self.con, statement_id, values, encoders, chunk_rows))
+            finally:
+                cur.release_statement(statement_id)
+        finally:
+            cur.close()
+
     def __del__(self):
         # TODO Thread-safety?
         self.close()
@@ -94,70 +534,475 @@ class Connection:
         for cur in list(self.cursors):  # self.cursors is materialized because cur.close modifies it
             cur.close()
         assert len(self.cursors) == 0
+        if self.open_batch is not None:
+            self.open_batch.end()
 
         try:
-            self.rollback()
+            if self.con.broken is None and not self._autocommit:
+                self.rollback()
         finally:
             self.con.close()
             self.con = None
 
 
+def batch_runs(statements):
+    """
+    Splits the queued statements into runs of consecutive statements
+    with the same query, each at most ``EXECUTEMANY_BATCH_SIZE`` long.
+    Returns a list of (index of the first statement, query, parameters).
+    """
+    runs = []
+    for i, (query, params) in enumerate(statements):
+        if runs and runs[-1][1] == query and len(runs[-1][2]) < EXECUTEMANY_BATCH_SIZE:
+            runs[-1][2].append(params)
+        else:
+            runs.append((i, query, [params]))
+    return runs
+
+
+def batch_error(e, start, count):
+    if count == 1:
+        error = type(e)(f"Statement {start} failed: {e}")
+    else:
+        error = type(e)(f"Statements {start} to {start + count - 1} failed: {e}")
+    error.index = start
+    return error
+
+
+class Batch:
+    """
+    Statements queued by :py:meth:`Connection.batch`.
+
+    When sending fails, no further requests are sent and the error has
+    an ``index`` attribute with the position of the failed statement.
+    For consecutive statements with the same query, which are sent in
+    one request, it is the position of the first of them.  Requests that
+    were already on the way may have been executed as well, so the
+    transaction has to be rolled back, which the context manager does.
+    """
+
+    def __init__(self, con, namespace):
+        self.con = con
+        self.namespace = namespace
+        self.statements = []  # (query, params)
+        #: Update count of each statement sent by the last flush
+        self.rowcounts = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def execute(self, query: str, params: List[Any] = ()):
+        """ Queues a SQL statement. """
+        if self.con is None:
+            raise ProgrammingError('Batch is finished')
+        if type(params) != list and type(params) != tuple:
+            raise ProgrammingError("Unexpected type for params " + str(type(params)))
+        self.statements.append((query, params))
+
+    def flush(self) -> List[int]:
+        """
+        Sends the queued statements and returns the update count of
+        each.
+        """
+        return run(self.send())
+
+    def send(self):
+        """ Steps of :py:meth:`flush`, see :py:func:`pipeline`. """
+        if self.con is None:
+            raise ProgrammingError('Batch is finished')
+        statements, self.statements = self.statements, []
+        self.rowcounts = []
+        if len(statements) == 0:
+            return self.rowcounts
+
+        rpc_con = self.con.con
+        cache = self.con.statement_cache
+        namespace = self.namespace
+        runs = batch_runs(statements)
+        signatures = {}  # query -> PreparedStatementSignature
+        uncached = {}  # query -> index of the first statement, for the queries to prepare
+        for start, query, _ in runs:
+            if query not in signatures and query not in uncached:
+                signature = cache.acquire(('sql', query, namespace, True))
+                if signature is None:
+                    uncached[query] = start
+                else:
+                    signatures[query] = signature
+
+        def prepare(query):
+            return rpc_con.prepare_indexed_statement('sql', query, namespace, wait=False)
+
+        def prepared(query, signature):
+            cache.add(rpc_con, ('sql', query, namespace, True), signature)
+            signatures[query] = signature
+
+        def execute(entry):
+            _, query, params = entry
+            return rpc_con.execute_indexed_statement_batch(signatures[query].statement_id, params, wait=False)
+
+        def executed(entry, r):
+            self.rowcounts.extend(r.scalars)
+
+        try:
+            # Prepare all queries that are not cached in one go
+            yield from pipeline(uncached, prepare, prepared, SCRIPT_WINDOW,
+                                lambda query, e: batch_error(e, uncached[query], 1),
+                                lambda query, signature: rpc_con.close_statement(signature.statement_id, wait=False))
+            yield from pipeline(runs, execute, executed, SCRIPT_WINDOW,
+                                lambda entry, e: batch_error(e, entry[0], len(entry[2])))
+        finally:
+            for signature in signatures.values():
+                if not cache.release(signature.statement_id):
+                    rpc_con.close_statement(signature.statement_id, wait=False)
+        return self.rowcounts
+
+    def end(self):
+        """ Drops the queued statements and detaches from the connection. """
+        self.statements.clear()
+        if self.con is not None:
+            self.con.open_batch = None
+            self.con = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        con = self.con
+        if con is None:  # The connection was closed
+            return
+        failed = exc_type is not None
+        try:
+            if not failed:
+                try:
+                    if con.autocommit:
+                        self.flush()
+                    else:
+                        con.commit()
+                except Error:
+                    failed = True
+                    raise
+        finally:
+            try:
+                if failed and not con.autocommit and con.con is not None and con.con.broken is None:
+                    con.rollback()
+            except Error:
+                pass  # Keeps the error that ended the batch
+            finally:
+                self.end()
+
+
+class FetchSizeTuner:
+    """
+    Adapts the fetch size of a result to the frames received so far.
+    It aims at frames of about ``target_bytes`` that take no longer
+    than ``max_latency`` seconds to arrive.  Pass an instance as
+    ``fetch_size`` to :py:meth:`Cursor.executeany`; when it is used
+    again for the next execution it starts from what it learned.
+
+    >>> import polypheny
+    >>> tuner = polypheny.FetchSizeTuner()
+    >>> cur.execute('SELECT * FROM fruits', fetch_size=tuner)
+    >>> rows = cur.fetchall()
+    >>> tuner.history  # doctest: +SKIP
+    [(100, 100, 1650, None), (400, 400, 6600, 0.004), ...]
+
+    :ivar size: The fetch size of the next request.
+    :ivar history: One ``(fetch_size, rows, bytes, seconds)`` tuple for
+                   each of the last ``history_size`` frames.  ``seconds``
+                   is ``None`` for the first frame of a result, which
+                   arrives together with the execution.
+    """
+
+    def __init__(self, initial: int = 100, *, target_bytes: int = 1 << 20, max_latency: float = 0.2,
+                 min_size: int = 1, max_size: int = 100000, growth: float = 4.0, history_size: int = 1000):
+        self.size = initial
+        self.target_bytes = target_bytes
+        self.max_latency = max_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.growth = growth
+        self.history = collections.deque(maxlen=history_size)
+        self.bytes_per_row = None
+        self.seconds_per_row = None
+
+    def observe(self, fetch_size, frame, seconds):
+        """
+        Records a frame fetched with ``fetch_size`` in ``seconds`` and
+        picks the size of the next one.
+        """
+        restype = frame.WhichOneof('result')
+        if restype == 'relational_frame':
+            rows = len(frame.relational_frame.rows)
+        elif restype == 'document_frame':
+            rows = len(frame.document_frame.documents)
+        else:
+            rows = 0
+        nbytes = frame.ByteSize()
+        self.history.append((fetch_size, rows, nbytes, seconds))
+        if rows == 0:
+            return  # Nothing to learn from
+
+        # Moving averages, so a few odd frames do not throw the size around
+        self.bytes_per_row = average(self.bytes_per_row, nbytes / rows)
+        size = self.target_bytes / self.bytes_per_row
+        if seconds is not None:
+            self.seconds_per_row = average(self.seconds_per_row, seconds / rows)
+            if self.seconds_per_row > 0:
+                size = min(size, self.max_latency / self.seconds_per_row)
+        size = min(size, self.size * self.growth)
+        self.size = max(self.min_size, min(self.max_size, int(size)))
+
+
+def average(old, new):
+    return new if old is None else (old + new) / 2
+
+
+def fetch_frame(con, statement_id, fetch_size):
+    """
+    Fetches the next frame of a result.  ``fetch_size`` is either the
+    number of rows or a :py:class:`FetchSizeTuner`.
+    """
+    if not isinstance(fetch_size, FetchSizeTuner):
+        return con.fetch(statement_id, fetch_size)
+    size = fetch_size.size
+    start = time.perf_counter()
+    frame = con.fetch(statement_id, size)
+    fetch_size.observe(size, frame, time.perf_counter() - start)
+    return frame
+
+
+class Prefetcher:
+    """
+    Fetches and decodes the next frames of a result on a helper thread
+    while the current one is consumed.  At most ``depth`` decoded frames
+    wait in the queue, then the thread blocks until one is taken.
+    """
+
+    def __init__(self, con, statement_id, fetch_size, decode, depth):
+        self.queue = queue.Queue(depth)
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, args=(con, statement_id, fetch_size, decode), daemon=True)
+        self.thread.start()
+
+    def run(self, con, statement_id, fetch_size, decode):
+        try:
+            while not self.stopped:
+                frame = fetch_frame(con, statement_id, fetch_size)
+                self.queue.put((decode(frame), frame.is_last))
+                if frame.is_last:
+                    return
+        except BaseException as e:
+            self.queue.put(e)
+
+    def get(self):
+        """ Returns the rows of the next frame and whether it is the last one. """
+        item = self.queue.get()
+        if isinstance(item, BaseException):
+            self.queue.put_nowait(item)  # The thread is gone, later calls fail the same way
+            raise item
+        return item
+
+    def stop(self):
+        """
+        Stops the thread and drops the frames it read ahead.  A fetch
+        that is already in flight is waited for.
+        """
+        self.stopped = True
+        # Emptying the queue lets a blocked put finish, after that the
+        # thread sees the flag before it puts anything else
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.thread.join()
+
+
 class ResultCursor:
-    def __init__(self, con, statement_id, frame, fetch_size):
+    """
+    Holds the decoded rows of the current frame of a result.  Frames
+    are decoded as a whole when they arrive and the protobuf messages
+    are dropped right after.  With ``prefetch`` greater than zero up to
+    that many of the following frames are read ahead by a
+    :py:class:`Prefetcher`.  A ``row_factory`` or ``document_factory``
+    from :py:mod:`polypheny.rows` changes how rows and documents are
+    built.
+    """
+
+    def __init__(self, con, statement_id, frame, fetch_size, prefetch=0, row_factory=None, document_factory=None):
         self.con = con
         self.statement_id = statement_id
         self.closed = False
-        self.frame = frame
+        # False when there were no results
+        self.has_results = frame is not None
+        self.restype = None
         self.fetch_size = fetch_size
+        self.rows = []
+        self.pos = 0
+        self.is_last = True
+        self.prefetcher = None
+        self.column_meta = None
+        self.released = False  # The statement was given back early
         if frame is not None:
-            restype = self.frame.WhichOneof('result')
+            restype = frame.WhichOneof('result')
             assert restype is not None
+            self.restype = restype
             if restype == 'relational_frame':
-                self.rows = iter(self.frame.relational_frame.rows)
+                self.column_meta = frame.relational_frame.column_meta
+                self.decode = RowDecoder(frame.relational_frame.column_meta)
+                if row_factory is not None:
+                    self.decode = row_factory(self.decode, describe(frame.relational_frame))
             elif restype == 'document_frame':
-                self.rows = iter(self.frame.document_frame.documents)
+                self.decode = decode_documents if document_factory is None else document_factory
             else:
-                self.closed = True
-                raise NotImplementedError(f'Resultset of type {restype} is not implemented')
+                # Graph frames have no content in this version of the
+                # protocol, so there is nothing to decode yet
+                self.discard()
+                raise NotSupportedError(f'Results of type {restype} are not supported')
+            self.rows = self.decode(frame)
+            self.is_last = frame.is_last
+            if prefetch > 0 and not self.is_last:
+                self.prefetcher = self.start_prefetch(prefetch)
 
     def __del__(self):
         assert self.closed
         self.close()
 
+    def release(self):
+        """
+        Gives back the statement of a result without rows, so other
+        cursors can use it before this one is closed.
+        """
+        self.released = True
+        if self.con.con.broken is None and not self.con.statement_cache.release(self.statement_id):
+            self.con.con.close_statement(self.statement_id, wait=False)
+
+    def discard(self):
+        """ Frees the result on the server without waiting for an answer. """
+        if self.con.con.broken is None:
+            if self.con.statement_cache.release(self.statement_id):
+                self.con.con.close_result(self.statement_id, wait=False)
+            else:
+                self.con.con.close_statement(self.statement_id, wait=False)
+        self.con = None
+        self.closed = True
+
     def close(self):
         if self.closed:
             return
         assert self.con.con is not None
         try:
-            self.con.con.close_statement(self.statement_id)
+            if self.prefetcher is not None:
+                self.prefetcher.stop()
+            if self.con.con.broken is not None:
+                pass  # Nothing to close on a dead connection
+            elif self.released:
+                pass
+            elif self.con.statement_cache.release(self.statement_id):
+                # Keep the prepared statement, but free the result on the server
+                if self.has_results:
+                    self.con.con.close_result(self.statement_id, wait=False)
+            else:
+                self.con.con.close_statement(self.statement_id, wait=not self.con.pipelining)
         finally:
             self.con = None
             self.closed = True
+            self.rows = []
 
-    def __next__(self):
-        # frame is None when there were no results
-        if self.frame is None:
+    def check(self):
+        if not self.has_results:
             raise Error("Previous statement did not produce any results")
 
-        assert self.rows is not None
+    def __next__(self):
+        self.check()
+        while self.pos >= len(self.rows):
+            if self.is_last:
+                raise StopIteration
+            self.nextframe()
+        row = self.rows[self.pos]
+        self.pos += 1
+        return row
 
-        try:
-            return next(self.rows)
-        except StopIteration:
-            if self.frame.is_last:
-                raise
-            return self.nextframe()
+    def take(self, size):
+        """
+        Returns up to ``size`` rows of the current frame, all remaining
+        ones if ``size`` is ``None``.
+        """
+        if self.pos == 0 and (size is None or size >= len(self.rows)):
+            rows = self.rows
+        else:
+            end = len(self.rows) if size is None else self.pos + size
+            rows = self.rows[self.pos:end]
+        self.pos += len(rows)
+        if self.pos >= len(self.rows):
+            self.rows = []  # Release the consumed frame
+            self.pos = 0
+        return rows
+
+    def fetch(self, size=None):
+        """
+        Returns the next ``size`` rows, or all remaining ones when
+        ``size`` is ``None``.
+        """
+        self.check()
+        results = self.take(size)
+        while (size is None or len(results) < size) and not self.is_last:
+            self.nextframe()
+            results.extend(self.take(None if size is None else size - len(results)))
+        return results
+
+    def chunks(self, size=None):
+        """
+        Like :py:meth:`fetch`, but yields the rows frame by frame.
+        """
+        self.check()
+        remaining = size
+        while True:
+            rows = self.take(remaining)
+            if len(rows) > 0:
+                yield rows
+                if remaining is not None:
+                    remaining -= len(rows)
+            if remaining == 0 or self.is_last:
+                return
+            self.nextframe()
+
+    def start_prefetch(self, depth):
+        return Prefetcher(self.con.con, self.statement_id, self.fetch_size, self.decode_frame, depth)
+
+    def decode_frame(self, frame):
+        """
+        Decodes a following frame of the result.  Frames without rows
+        may come without a result type.
+        """
+        restype = frame.WhichOneof('result')
+        if restype is not None and restype != self.restype:
+            raise InterfaceError(f"Result of type {self.restype} continued with a frame of type {restype}")
+        return self.decode(frame)
+
+    def load(self, frame):
+        self.rows = self.decode_frame(frame)
+        self.pos = 0
+        self.is_last = frame.is_last
 
     def nextframe(self):
-        self.frame = self.con.con.fetch(self.statement_id, self.fetch_size)
-        self.rows = iter(self.frame.relational_frame.rows)  # TODO result must not be relational
-        return next(self.rows)  # TODO: What happens if this returns StopIteration, but another frame could be fetched?
+        if self.prefetcher is not None:
+            self.rows, self.is_last = self.prefetcher.get()
+            self.pos = 0
+        else:
+            self.load(fetch_frame(self.con.con, self.statement_id, self.fetch_size))
 
 
 class Cursor:
     def __init__(self, con):
         self.con = con
         self.result = None
+        #: Row factory from :py:mod:`polypheny.rows` for relational results,
+        #: ``None`` gives lists
+        self.row_factory = con.row_factory
+        #: Document factory from :py:mod:`polypheny.rows` for document
+        #: results, ``None`` gives dicts
+        self.document_factory = con.document_factory
         self.reset()
 
     def reset(self):
@@ -194,27 +1039,107 @@ class Cursor:
         return n
 
     def derive_description(self, relframe):
-        self.description = []
-        for column in relframe.column_meta:
-            self.description.append(
-                (column.column_label, None, None, None, None, column.precision, column.scale, column.is_nullable))
+        self.description = describe(relframe)
 
-    def execute(self, query: str, params: List[Any] = None, *, fetch_size: int = None):
+    def execute(self, query: str, params: List[Any] = None, *, fetch_size: Union[int, FetchSizeTuner] = None,
+                prefetch: int = 0):
         """
         Executes a SQL query.
         """
-        return self.executeany('sql', query, params, fetch_size=fetch_size)
+        return self.executeany('sql', query, params, fetch_size=fetch_size, prefetch=prefetch)
 
-    def executemany(self, query: str, params: List[List[Any]]):
+    def executemany(self, query: str, params: List[List[Any]], *, batch_size: int = EXECUTEMANY_BATCH_SIZE):
         """
         Execute `query` once with each item in `params` as parameters.
+
+        The statement is prepared once and the parameters are sent in
+        batches of ``batch_size`` sets.  Afterwards ``rowcount`` holds
+        the sum of all update counts.  When a batch fails, the error
+        names the batch and its rows, and ``rowcount`` holds the
+        updates of the batches before it.  Named parameters are
+        executed one by one, because Polypheny has no batches for them.
         """
-        # TODO: Optimize, this is to exercise the execute code more
-        for param in params:
-            self.execute(query, param)
+        if self.con is None:
+            raise Error("Cursor is closed")
+
+        self.reset()
+
+        params = iter(params)
+        first = next(params, None)
+        if first is None:
+            self.rowcount = 0
+            return
+        params = itertools.chain((first,), params)
+        if type(first) == dict:
+            rowcount = 0
+            for param in params:
+                self.execute(query, param)
+                rowcount += self.rowcount
+            self.reset()
+            self.rowcount = rowcount
+            return
+
+        statement_id = self.prepare('sql', query, None, True).statement_id
+        try:
+            self.rowcount = 0
+            start = 0
+            for n in itertools.count():
+                batch = list(itertools.islice(params, batch_size))
+                if len(batch) == 0:
+                    break
+                for param in batch:
+                    if type(param) != list and type(param) != tuple:
+                        raise Error("Unexpected type for params " + str(type(param)))
+                try:
+                    r = self.con.con.execute_indexed_statement_batch(statement_id, batch)
+                except Error as e:
+                    raise type(e)(f"Batch {n} with rows {start} to {start + len(batch) - 1} failed: {e}") from e
+                self.rowcount += sum(r.scalars)
+                start += len(batch)
+        finally:
+            self.release_statement(statement_id)
+
+    def executescript(self, lang: str, statements: List[str], *, namespace: str = None,
+                      window: int = SCRIPT_WINDOW) -> List[int]:
+        """
+        Executes the statements one after the other and returns the
+        update count of each, ``-1`` for statements with a result, which
+        is discarded.  Afterwards ``rowcount`` holds the sum of the
+        update counts.
+
+        The statements are sent without waiting for the ones before, with
+        up to ``window`` of them on the way.  When a statement fails, no
+        further statements are sent, and the error has an ``index``
+        attribute with the position of the failed statement.  Up to
+        ``window - 1`` statements after it were already on the way and
+        may have been executed as well.  With ``window=1`` every
+        statement waits for the one before, and nothing runs after a
+        failed statement.
+
+        >>> cur.executescript('sql', [
+        ...     'CREATE TABLE demo(id INTEGER PRIMARY KEY)',
+        ...     'INSERT INTO demo(id) VALUES (1), (2)',
+        ... ])  # doctest: +SKIP
+        [0, 2]
+        """
+        if self.con is None:
+            raise Error("Cursor is closed")
+        if isinstance(statements, str):
+            raise ProgrammingError("statements must be a list of statements")
+        if window < 1:
+            raise ProgrammingError("window must be at least 1")
+
+        self.reset()
+
+        rowcounts = []
+        try:
+            run(script_steps(self.con.con, lang, statements, namespace, rowcounts, window))
+        finally:
+            self.rowcount = sum(count for count in rowcounts if count > 0)
+        return rowcounts
 
     def executeany(self, lang: str, query: str, params: List[Any] = None, *,
-                   fetch_size: int = None, namespace: str = None):
+                   fetch_size: Union[int, FetchSizeTuner] = None, namespace: str = None, prefetch: int = 0):
         """
         This method is used to query Polypheny in any of the supported
         languages.  Dynamic parameter substitution is language
@@ -223,11 +1148,17 @@ class Cursor:
         :param lang:
         :param query:
         :param params:
+        :param fetch_size: Rows per frame of the result, or a
+                           :py:class:`FetchSizeTuner` that picks them.
         :param namespace: Sets the default namespace for the query.
+        :param prefetch: Number of result frames a helper thread fetches
+                         and decodes ahead of the application.  ``0``
+                         fetches a frame only when it is needed.
 
         .. Note::
 
-           Queries returning graphs are not supported yet.
+           Queries returning graphs raise :py:exc:`NotSupportedError`,
+           because the protocol does not transfer graph results yet.
 
         To query Polypheny using the MongoQL:
 
@@ -241,19 +1172,28 @@ class Cursor:
 
         self.reset()
 
+        tuner = fetch_size if isinstance(fetch_size, FetchSizeTuner) else None
+        size = fetch_size if tuner is None else tuner.size
+
         if params is None:  # Unparameterized query
-            r = self.con.con.execute_unparameterized_statement(lang, query, fetch_size, namespace)
+            r = self.con.con.execute_unparameterized_statement(lang, query, size, namespace)
             assert r.HasField("result")  # Is this always true?
             statement_id = r.statement_id
             result = r.result
         elif type(params) == list or type(params) == tuple:
-            resp = self.con.con.prepare_indexed_statement(lang, query, namespace)
-            statement_id = resp.statement_id
-            result = self.con.con.execute_indexed_statement(statement_id, params, fetch_size)
+            statement_id = self.prepare(lang, query, namespace, True).statement_id
+            try:
+                result = self.con.con.execute_indexed_statement(statement_id, params, size)
+            except Exception:
+                self.con.statement_cache.remove(self.con.con, statement_id)
+                raise
         elif type(params) == dict:
-            resp = self.con.con.prepare_named_statement(lang, query, namespace)
-            statement_id = resp.statement_id
-            result = self.con.con.execute_named_statement(statement_id, params, fetch_size)
+            statement_id = self.prepare(lang, query, namespace, False).statement_id
+            try:
+                result = self.con.con.execute_named_statement(statement_id, params, size)
+            except Exception:
+                self.con.statement_cache.remove(self.con.con, statement_id)
+                raise
         else:
             raise Error("Unexpected type for params " + str(type(params)))
 
@@ -267,52 +1207,143 @@ class Cursor:
             self.rowcount = result.scalar
             frame = None
 
-        self.result = ResultCursor(self.con, statement_id, frame, fetch_size)
+        if tuner is not None and frame is not None:
+            tuner.observe(size, frame, None)
+        self.result = ResultCursor(self.con, statement_id, frame, fetch_size, prefetch, self.row_factory,
+                                   self.document_factory)
+        if frame is None:
+            # Without an open result, other cursors can use the statement right away
+            self.result.release()
 
-    def fetchone(self):
+    def prepare(self, lang, query, namespace, indexed):
+        """
+        Returns the signature of a prepared statement for ``query``,
+        reusing a cached one when possible.
+        """
+        cache = self.con.statement_cache
+        key = (lang, query, namespace, indexed)
+        signature = cache.acquire(key)
+        if signature is None:
+            if indexed:
+                signature = self.con.con.prepare_indexed_statement(lang, query, namespace)
+            else:
+                signature = self.con.con.prepare_named_statement(lang, query, namespace)
+            cache.add(self.con.con, key, signature)
+        return signature
+
+    def release_statement(self, statement_id):
+        """ Gives back a statement that has no open result. """
+        if not self.con.statement_cache.release(statement_id):
+            self.con.con.close_statement(statement_id, wait=False)
+
+    def check_result(self):
         if self.con is None:
             raise ProgrammingError("Cursor is closed")
 
         if self.result is None:
             raise ProgrammingError("No statement was yet executed")
 
+    def fetchone(self):
+        self.check_result()
         try:
-            n = next(self.result)
+            return next(self.result)
         except StopIteration:
             return None
 
-        if isinstance(n, relational_frame_pb2.Row):
-            v = []
-            for value in n.values:
-                v.append(proto2py(value))
-            return v
-        elif isinstance(n, value_pb2.ProtoDocument):
-            value = value_pb2.ProtoValue()
-            value.document.CopyFrom(n)
-            return proto2py(value)
-        else:
-            raise Error(f"Unknown result of type {type(n)}")
-
     def fetchmany(self, size=None):
-        # TODO: Optimize, this is to exercise the fetch code more
+        self.check_result()
         if size is None:
             size = self.arraysize
-        results = []
-        for _ in range(size):
-            row = self.fetchone()
-            if row is None:
-                break
-            results.append(row)
-        return results
+        return self.result.fetch(size)
 
     def fetchall(self):
-        results = []
-        while True:
-            row = self.fetchone()
-            if row is None:
-                break
-            results.append(row)
-        return results
+        self.check_result()
+        return self.result.fetch()
+
+    def iter_ndjson(self):
+        """
+        Yields the remaining documents of a document result as NDJSON,
+        one :py:class:`bytes` object per frame, to write them to a file
+        or a response.  With the
+        :py:func:`polypheny.rows.ndjson_document` factory the JSON is
+        written straight from the server values, otherwise the
+        documents are dumped with :py:mod:`json`.
+
+        >>> import polypheny.rows
+        >>> cur.document_factory = polypheny.rows.ndjson_document
+        >>> cur.executeany('mongo', 'db.fruits.find()')
+        >>> for chunk in cur.iter_ndjson():
+        ...     out.write(chunk)  # doctest: +SKIP
+        """
+        self.check_result()
+        if self.description is not None:
+            raise ProgrammingError("NDJSON can only be fetched from document results")
+        for documents in self.result.chunks():
+            yield rows.ndjson_lines(documents)
+
+    def fetch_numpy(self):
+        """
+        Fetches all remaining rows as a :py:class:`dict` of column name
+        to NumPy array.  The arrays are built frame by frame from the
+        decoded rows, so only one frame is held in Python objects at a
+        time.  Integer, floating point and boolean columns get matching
+        dtypes, ``DATE`` and ``TIMESTAMP`` columns become
+        ``datetime64[ms]`` in UTC and ``TIME`` columns
+        ``timedelta64[ms]``.  All other types are object arrays.
+        Columns that can be ``NULL`` are :py:class:`numpy.ma.MaskedArray`
+        with the ``NULL`` values masked.  Columns with the same name
+        raise :py:class:`ProgrammingError`.  Needs NumPy to be installed.
+
+        >>> cur.execute('SELECT id, name FROM fruits')
+        >>> cur.fetch_numpy()  # doctest: +SKIP
+        {'id': array([1], dtype=int32), 'name': array(['Orange'], dtype=object)}
+        """
+        return self.build_columns(columns.NumpyBuilder, None)
+
+    def fetchmany_numpy(self, size: int = None):
+        """
+        Like :py:meth:`fetch_numpy`, but fetches at most ``size`` rows,
+        ``arraysize`` by default.
+        """
+        if size is None:
+            size = self.arraysize
+        return self.build_columns(columns.NumpyBuilder, size)
+
+    def iter_arrow_batches(self):
+        """
+        Yields the remaining rows as one :py:class:`pyarrow.RecordBatch`
+        per frame, so only one frame at a time is held in Python
+        objects.  The Arrow types come from the column metadata:
+        ``DECIMAL`` becomes ``decimal128`` with the column's precision
+        and scale, ``TIMESTAMP`` becomes ``timestamp[ms, tz=UTC]``, and
+        values of types without an Arrow equivalent, like documents,
+        become JSON text.  Needs PyArrow to be installed.
+
+        >>> cur.execute('SELECT id, name FROM fruits')
+        >>> for batch in cur.iter_arrow_batches():  # doctest: +SKIP
+        ...     print(batch.num_rows)
+        1
+        """
+        self.check_result()
+        builder = columns.ArrowBuilder(self.description, self.result.column_meta)
+        for rows in self.result.chunks():
+            yield builder.batch(rows)
+
+    def fetch_arrow_table(self):
+        """
+        Fetches all remaining rows as a :py:class:`pyarrow.Table`, see
+        :py:meth:`iter_arrow_batches`.
+        """
+        self.check_result()
+        builder = columns.ArrowBuilder(self.description, self.result.column_meta)
+        return builder.table([builder.batch(rows) for rows in self.result.chunks()])
+
+    def build_columns(self, builder, size):
+        self.check_result()
+        builder = builder(self.description)
+        for rows in self.result.chunks(size):
+            builder.add(rows)
+        return builder.result()
 
     # optional
     # def nextset(self):
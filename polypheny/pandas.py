@@ -0,0 +1,161 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Reads query results into :py:class:`pandas.DataFrame` objects.  The
+columns are built frame by frame with the same converters as
+:py:meth:`polypheny.Cursor.fetch_numpy` and
+:py:meth:`polypheny.Cursor.fetch_arrow_table`, so only the rows of one
+frame exist as Python objects at a time.
+
+>>> import polypheny.pandas
+>>> df = polypheny.pandas.read_sql(con, 'SELECT id, name FROM fruits')  # doctest: +SKIP
+"""
+
+from typing import Any, Iterator, List, Union
+
+from polypheny import columns
+from polypheny.exceptions import *
+
+DTYPE_BACKENDS = (None, 'numpy_nullable', 'pyarrow')
+
+STRING_TYPES = ('CHAR', 'VARCHAR', 'TEXT')
+
+
+def import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise NotSupportedError("pandas is not installed, install it with pip install polypheny[pandas]") from None
+    return pandas
+
+
+def read_sql(con, query: str, params: List[Any] = None, *, chunksize: int = None, dtype_backend: str = None,
+             categorical: float = None, fetch_size=None) -> Union['pandas.DataFrame', Iterator['pandas.DataFrame']]:
+    """
+    Executes a SQL query on the connection ``con`` and returns the
+    result as a :py:class:`pandas.DataFrame`.
+
+    :param chunksize:  When given, an iterator of DataFrames with at
+                       most this many rows is returned instead.
+    :param dtype_backend:  ``None`` gives the classic NumPy dtypes, with
+                           integer columns that contain ``NULL`` turned
+                           into ``float64``.  ``'numpy_nullable'`` uses
+                           the pandas extension types like ``Int32`` and
+                           ``string``, ``'pyarrow'`` uses
+                           :py:class:`pandas.ArrowDtype`.
+    :param categorical:  String columns with at most this share of
+                         distinct values, like ``0.1``, become
+                         :py:class:`pandas.Categorical`.
+    :param fetch_size:  See :py:meth:`polypheny.Cursor.executeany`.
+
+    ``TIMESTAMP`` columns are timezone aware in UTC.  ``DECIMAL``
+    columns hold :py:class:`decimal.Decimal` objects, except with the
+    ``pyarrow`` backend, where they are ``decimal128``.  ``INTERVAL``
+    columns are ``timedelta64`` when no value has months, otherwise they
+    hold :py:class:`~polypheny.interval.IntervalMonthMilliseconds`.
+    """
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ProgrammingError(f"Unknown dtype_backend {dtype_backend}, expected one of {DTYPE_BACKENDS}")
+    if chunksize is not None and chunksize < 1:
+        raise ProgrammingError("chunksize must be positive")
+    pd = import_pandas()
+    cur = con.cursor()
+    cur.row_factory = None  # The builders take the plain rows
+    try:
+        cur.execute(query, params, fetch_size=fetch_size)
+    except BaseException:
+        cur.close()
+        raise
+    if chunksize is None:
+        try:
+            return build(pd, cur, None, dtype_backend, categorical)
+        finally:
+            cur.close()
+    return read_chunks(pd, cur, chunksize, dtype_backend, categorical)
+
+
+def read_chunks(pd, cur, chunksize, dtype_backend, categorical):
+    try:
+        while True:
+            df = build(pd, cur, chunksize, dtype_backend, categorical)
+            if len(df) == 0:
+                return
+            yield df
+            if len(df) < chunksize:
+                return
+    finally:
+        cur.close()
+
+
+def build(pd, cur, size, dtype_backend, categorical):
+    cur.check_result()
+    if dtype_backend == 'pyarrow':
+        builder = columns.ArrowBuilder(cur.description, cur.result.column_meta)
+        table = builder.table([builder.batch(rows) for rows in cur.result.chunks(size)])
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        builder = columns.NumpyBuilder(cur.description)
+        for rows in cur.result.chunks(size):
+            builder.add(rows)
+        # Positional, so columns with the same name are all kept
+        series = [to_series(pd, builder.np, array, column[1], dtype_backend)
+                  for array, column in zip(builder.arrays(), cur.description)]
+        df = pd.DataFrame(dict(enumerate(series)))
+        df.columns = [column[0] for column in cur.description]
+    if categorical is not None:
+        for i, column in enumerate(cur.description):
+            if column[1] in STRING_TYPES:
+                values = df.iloc[:, i]
+                if len(values) > 0 and values.nunique() <= categorical * len(values):
+                    df.isetitem(i, values.astype('category'))
+    return df
+
+
+def to_series(pd, np, array, type_code, dtype_backend):
+    """ Turns an array of :py:class:`polypheny.columns.NumpyBuilder` into a Series. """
+    mask = None
+    if isinstance(array, np.ma.MaskedArray):
+        mask = np.ma.getmaskarray(array)
+        array = array.data
+    kind = array.dtype.kind
+
+    if type_code == 'TIMESTAMP':
+        return pd.Series(array).dt.tz_localize('UTC')
+    if type_code == 'INTERVAL':
+        if all(v is None or v.months == 0 for v in array):
+            return pd.Series(np.array([None if v is None else v.milliseconds for v in array], 'timedelta64[ms]'))
+        return pd.Series(array)
+
+    if dtype_backend == 'numpy_nullable':
+        if mask is None:
+            mask = np.zeros(len(array), bool)
+        if kind in 'iu':
+            return pd.Series(pd.arrays.IntegerArray(array, mask))
+        if kind == 'f':
+            return pd.Series(pd.arrays.FloatingArray(array, mask))
+        if kind == 'b':
+            return pd.Series(pd.arrays.BooleanArray(array, mask))
+        if type_code in STRING_TYPES:
+            return pd.Series(pd.array(array, dtype='string'))
+        return pd.Series(array)
+
+    if mask is not None and mask.any():
+        if kind in 'iuf':
+            array = array.astype('float64')
+            array[mask] = np.nan
+        elif kind == 'b':
+            array = array.astype(object)
+            array[mask] = None
+    return pd.Series(array)
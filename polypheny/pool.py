@@ -0,0 +1,229 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import contextlib
+import threading
+import time
+from typing import Union
+
+import polypheny
+from polypheny.connection import Connection
+from polypheny.exceptions import *
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of connections.  The connection parameters are
+    the same as for :py:func:`polypheny.connect`.
+
+    >>> import polypheny.pool
+    >>> pool = polypheny.pool.ConnectionPool(max_size=4)  # doctest: +SKIP
+    >>> with pool.connection() as con:  # doctest: +SKIP
+    ...     cur = con.cursor()
+    ...     cur.execute('SELECT 1')
+
+    Idle connections are evicted when the pool is used, there is no
+    background thread.
+
+    :param min_size:  Connections opened up front and kept even when idle.
+    :param max_size:  Upper bound of open connections.
+    :param timeout:  Default seconds :py:meth:`getconn` waits for a free
+                     connection, ``None`` waits forever.
+    :param max_idle:  Seconds after which an idle connection above
+                      ``min_size`` is closed.
+    :param max_lifetime:  Seconds after which a connection is closed
+                          instead of being reused.
+    """
+
+    def __init__(self, address: Union[tuple[str, int], str] = None, *, username: str = None, password: str = None,
+                 transport: str = None, min_size: int = 1, max_size: int = 10, timeout: float = 30.0,
+                 max_idle: float = 600.0, max_lifetime: float = 3600.0, **kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ProgrammingError("Invalid pool size")
+        self.address = address
+        self.username = username
+        self.password = password
+        self.transport = transport
+        self.kwargs = kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+
+        self.cond = threading.Condition()
+        self.idle = collections.deque()  # (connection, returned at), most recently returned last
+        self.created = {}  # connection -> opened at, for all open connections
+        self.opening = 0  # Connections being opened right now
+        self.closed = False
+
+        try:
+            for _ in range(min_size):
+                con = self.open()
+                with self.cond:
+                    self.idle.append((con, time.monotonic()))
+        except BaseException:
+            self.close()
+            raise
+
+    def open(self):
+        con = polypheny.connect(self.address, username=self.username, password=self.password,
+                                transport=self.transport, **self.kwargs)
+        with self.cond:
+            self.created[con] = time.monotonic()
+        return con
+
+    def getconn(self, timeout: float = None) -> Connection:
+        """
+        Takes a connection out of the pool.  Blocks until one is free,
+        at most ``timeout`` seconds or the pool's default.  Raises
+        :py:class:`~polypheny.OperationalError` when the time is up.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            discard = []
+            con = None
+            with self.cond:
+                while True:
+                    if self.closed:
+                        raise ProgrammingError("Pool is closed")
+                    discard.extend(self.evict())
+                    if self.idle:
+                        con, _ = self.idle.pop()
+                        break
+                    if len(self.created) + self.opening < self.max_size:
+                        self.opening += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise OperationalError(f"No connection available after {timeout} seconds")
+                    self.cond.wait(remaining)
+            self.discard(discard)
+
+            if con is None:
+                try:
+                    return self.open()
+                finally:
+                    with self.cond:
+                        self.opening -= 1
+                        self.cond.notify()
+
+            if con.con is not None and con.con.is_usable():
+                return con
+            # Died while idle, try the next one
+            self.discard([con])
+
+    def putconn(self, con: Connection):
+        """
+        Returns a connection to the pool.  Lingering cursors are closed,
+        the statements of an open batch are dropped, and the open
+        transaction is rolled back, except in autocommit mode.  Connections that fail
+        this or are too old are closed instead.
+        """
+        with self.cond:
+            if con not in self.created:
+                raise ProgrammingError("Connection does not belong to this pool")
+            keep = not self.closed and time.monotonic() - self.created[con] < self.max_lifetime
+        if keep:
+            keep = self.reset(con)
+        if not keep:
+            self.discard([con])
+            return
+        with self.cond:
+            if self.closed:
+                keep = False
+            else:
+                self.idle.append((con, time.monotonic()))
+                self.cond.notify()
+        if not keep:
+            self.discard([con])
+
+    @contextlib.contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Context manager that takes a connection from the pool and gives
+        it back at the end of the block.
+        """
+        con = self.getconn(timeout)
+        try:
+            yield con
+        finally:
+            self.putconn(con)
+
+    def close(self):
+        """
+        Closes all idle connections.  Connections currently in use are
+        closed when they are returned.
+        """
+        with self.cond:
+            self.closed = True
+            discard = [con for con, _ in self.idle]
+            self.idle.clear()
+            self.cond.notify_all()
+        self.discard(discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def reset(self, con):
+        if con.con is None or con.con.broken is not None:
+            return False
+        try:
+            for cur in list(con.cursors):
+                cur.close()
+            if con.open_batch is not None:
+                con.open_batch.end()
+            if not con.autocommit:
+                con.rollback()
+            # Connections go back to the mode the pool opened them in
+            con.autocommit = self.kwargs.get('autocommit', False)
+        except Exception:
+            return False
+        return con.con.broken is None
+
+    def evict(self):
+        """
+        Removes expired idle connections from the pool and returns them.
+        Must be called with the lock held.
+        """
+        now = time.monotonic()
+        evicted = []
+        kept = collections.deque()
+        for con, returned in self.idle:
+            if now - self.created[con] >= self.max_lifetime:
+                evicted.append(con)
+            elif now - returned >= self.max_idle and len(self.created) - len(evicted) > self.min_size:
+                evicted.append(con)
+            else:
+                kept.append((con, returned))
+        self.idle = kept
+        for con in evicted:
+            del self.created[con]
+        return evicted
+
+    def discard(self, connections):
+        for con in connections:
+            with self.cond:
+                if self.created.pop(con, None) is not None:
+                    self.cond.notify()
+            try:
+                con.close()
+            except Exception:
+                pass
@@ -0,0 +1,284 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Row factories decide what the rows of a relational result look like.
+A row factory is called once per result with the
+:py:class:`~polypheny.connection.RowDecoder` of the result and its
+``description``, and returns a function that turns a frame into a list
+of rows.
+
+>>> import polypheny.rows
+>>> cur.row_factory = polypheny.rows.lazy_row
+>>> cur.execute('SELECT id, name FROM fruits')
+>>> row = cur.fetchone()
+>>> row['name']
+'Orange'
+
+Document results have document factories instead, which are called
+with each frame.  By default documents are dicts.
+
+The row factories other than :py:func:`lazy_row` compile a function for
+each result that decodes the cells of a row straight into the arguments
+of the row constructor, so a row costs one allocation.
+"""
+
+import collections
+import dataclasses
+import json
+import operator
+from collections.abc import Mapping, Sequence
+
+from polypheny.exceptions import *
+from polypheny.serialize import nested_json, proto2py
+
+UNSET = object()
+
+
+class LazyRow(Sequence):
+    """
+    A row that keeps the protobuf values of the server and decodes a
+    cell when it is first read.  Cells are found by position or by
+    column name, and the row compares equal to a list or tuple of the
+    same values.
+    """
+    __slots__ = ('values', 'decoders', 'names', 'cells')
+
+    def __init__(self, values, decoders, names):
+        self.values = values
+        self.decoders = decoders
+        self.names = names  # Column name -> position, shared by all rows of a result
+        self.cells = None
+
+    def cell(self, i):
+        cells = self.cells
+        if cells is None:
+            cells = self.cells = [UNSET] * len(self.values)
+        value = cells[i]
+        if value is UNSET:
+            value = cells[i] = self.decoders[i](self.values[i])
+        return value
+
+    def __getitem__(self, key):
+        if type(key) is str:
+            return self.cell(self.names[key])
+        if type(key) is slice:
+            return [self.cell(i) for i in range(*key.indices(len(self.values)))]
+        if key < 0:
+            key += len(self.values)
+        if not 0 <= key < len(self.values):
+            raise IndexError("Row index out of range")
+        return self.cell(key)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        for i in range(len(self.values)):
+            yield self.cell(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyRow, list, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'LazyRow({list(self)!r})'
+
+
+def lazy_row(decoder, description):
+    """
+    Row factory for :py:class:`LazyRow` objects.  Scans of wide tables
+    that only read a few columns skip decoding the others.
+    """
+    names = {}
+    for i, column in enumerate(description):
+        names.setdefault(column[0], i)
+
+    def make(frame):
+        rows = frame.relational_frame.rows
+        if len(rows) == 0:
+            return []
+        decoder.check(rows[0])
+        decoders = decoder.decoders
+        return [LazyRow(row.values, decoders, names) for row in rows]
+
+    return make
+
+
+def compile_rows(decoder, description, row, env=None):
+    """
+    Returns a function turning a frame into a list of rows.  ``row`` is
+    called with the Python expressions of the cells, like ``d0(v[0])``,
+    and returns the expression that builds one row from them.  Names
+    the expression uses go into ``env``.
+    """
+    n = len(description)
+    cells = [f'd{i}(v[{i}])' for i in range(n)]
+    unpack = f'    {"".join(f"d{i}, " for i in range(n))}= decoders[:{n}]\n' if n > 0 else ''
+    source = (f'def build(rows, decoders):\n'
+              f'{unpack}'
+              f'    return [{row(cells)} for v in map(values, rows)]\n')
+    namespace = dict(env or {}, values=operator.attrgetter('values'))
+    exec(source, namespace)
+    build = namespace['build']
+
+    def make(frame):
+        rows = frame.relational_frame.rows
+        if len(rows) == 0:
+            return []
+        decoder.check(rows[0])
+        return build(rows, decoder.decoders)
+
+    return make
+
+
+def tuple_row(decoder, description):
+    """ Row factory for tuples. """
+    return compile_rows(decoder, description, lambda cells: f'({"".join(c + ", " for c in cells)})')
+
+
+def namedtuple_row(decoder, description):
+    """
+    Row factory for named tuples with the column labels as fields.
+    Labels that are no valid field names are replaced by ``_0``, ``_1``
+    and so on.
+    """
+    cls = collections.namedtuple('Row', [column[0] for column in description], rename=True)
+    return compile_rows(decoder, description, lambda cells: f'Row({", ".join(cells)})', {'Row': cls})
+
+
+def dict_row(decoder, description):
+    """ Row factory for dicts of column label to value. """
+    names = [column[0] for column in description]
+    return compile_rows(decoder, description,
+                        lambda cells: '{' + ', '.join(f'{name!r}: {c}' for name, c in zip(names, cells)) + '}')
+
+
+def dataclass_row(cls):
+    """
+    Returns a row factory for instances of the dataclass ``cls``.  Each
+    column goes into the field of the same name, compared without case
+    if there is no exact match.  Fields without a column keep their
+    defaults.
+
+    >>> import dataclasses
+    >>> import polypheny.rows
+    >>> @dataclasses.dataclass
+    ... class Fruit:
+    ...     id: int
+    ...     name: str
+    >>> cur.row_factory = polypheny.rows.dataclass_row(Fruit)
+    """
+    if not dataclasses.is_dataclass(cls) or not isinstance(cls, type):
+        raise ProgrammingError(f"{cls} is not a dataclass")
+    fields = [field.name for field in dataclasses.fields(cls) if field.init]
+
+    def factory(decoder, description):
+        names = []
+        for column in description:
+            if column[0] in fields:
+                names.append(column[0])
+                continue
+            matches = [field for field in fields if field.lower() == column[0].lower()]
+            if len(matches) != 1:
+                raise ProgrammingError(f"Column {column[0]} has no field in {cls.__name__}")
+            names.append(matches[0])
+        if len(set(names)) != len(names):
+            raise ProgrammingError(f"Several columns go into the same field of {cls.__name__}")
+        return compile_rows(decoder, description,
+                            lambda cells: f'cls({", ".join(f"{name}={c}" for name, c in zip(names, cells))})',
+                            {'cls': cls})
+
+    return factory
+
+
+class LazyDocument(Mapping):
+    """
+    A read-only document that keeps the protobuf entries of the server.
+    The keys are decoded on the first lookup, a value when it is first
+    read.  Nested documents are :py:class:`LazyDocument` objects as
+    well, lists are decoded as a whole.
+    """
+    __slots__ = ('entries', 'index', 'cache')
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.index = None  # Key -> position in entries
+        self.cache = {}
+
+    def keys_index(self):
+        index = self.index
+        if index is None:
+            index = self.index = {}
+            for i, entry in enumerate(self.entries):
+                key = entry.key
+                index[key.string.string if key.WhichOneof('value') == 'string' else proto2py(key)] = i
+        return index
+
+    def __getitem__(self, key):
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        value = self.entries[self.keys_index()[key]].value
+        if value.WhichOneof('value') == 'document':
+            result = LazyDocument(value.document.entries)
+        else:
+            result = proto2py(value)
+        self.cache[key] = result
+        return result
+
+    def __len__(self):
+        return len(self.keys_index())
+
+    def __iter__(self):
+        return iter(self.keys_index())
+
+    def __repr__(self):
+        return f'LazyDocument({dict(self)!r})'
+
+
+def lazy_document(frame):
+    """ Document factory for :py:class:`LazyDocument` objects. """
+    return [LazyDocument(document.entries) for document in frame.document_frame.documents]
+
+
+def ndjson_document(frame):
+    """
+    Document factory that turns each document straight into a line of
+    JSON, as UTF-8 encoded :py:class:`bytes` ending in a newline.  See
+    :py:meth:`polypheny.Cursor.iter_ndjson`.
+    """
+    lines = []
+    for document in frame.document_frame.documents:
+        parts = nested_json([], document.entries, True)
+        parts.append('\n')
+        lines.append(''.join(parts).encode())
+    return lines
+
+
+def json_default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+def ndjson_lines(documents):
+    """ Returns NDJSON for documents that are not already lines of it. """
+    if type(documents[0]) is bytes:
+        return b''.join(documents)
+    return b''.join(json.dumps(document, default=json_default).encode() + b'\n' for document in documents)
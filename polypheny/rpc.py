@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import os
+import select
 import socket
+import threading
 
 from polypheny.exceptions import Error
 from polypheny.serialize import *
@@ -26,22 +29,61 @@ from org.polypheny.prism import version
 POLYPHENY_API_MAJOR = version.MAJOR_VERSION
 POLYPHENY_API_MINOR = version.MINOR_VERSION
 
+# Frames larger than this are rejected before any memory is allocated for them
+DEFAULT_MAX_FRAME_SIZE = 1 << 30
+# Size of the reused receive buffer, larger frames get a buffer of their own
+INITIAL_BUFFER_SIZE = 1 << 16
+# Messages up to this size are copied behind their header, which is
+# cheaper than setting up a vectored send
+SMALL_MESSAGE_SIZE = 1 << 15
+# Upper bound of buffers passed to a single sendmsg call
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+
 class PlainTransport:
     VERSION = "plain-v1@polypheny.com"
 
-    def __init__(self, address):
+    def __init__(self, address, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
         self.con = socket.create_connection(address)
         self.con.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.init_buffer(max_frame_size)
         self.exchange_version(self.VERSION)
 
+    def init_buffer(self, max_frame_size):
+        if max_frame_size is None:
+            max_frame_size = DEFAULT_MAX_FRAME_SIZE
+        self.max_frame_size = max_frame_size
+        self.buf = bytearray(min(INITIAL_BUFFER_SIZE, max_frame_size))
+        self.view = memoryview(self.buf)
+
+    def recv_exact(self, n):
+        """
+        Reads exactly ``n`` bytes into the receive buffer and returns a
+        memoryview of them.  The view is only valid until the next call.
+        """
+        if n > len(self.buf):
+            # Allocated for this frame only, so a single large frame does
+            # not keep its memory for the lifetime of the connection
+            view = memoryview(bytearray(n))
+        else:
+            view = self.view[:n]
+        pos = 0
+        while pos < n:
+            k = self.con.recv_into(view[pos:], n - pos)
+            if k == 0:
+                raise EOFError
+            pos += k
+        return view
+
     def exchange_version(self, version):
-        bl = self.con.recv(1)
-        if len(bl) != 1:
-            raise EOFError
+        bl = bytes(self.recv_exact(1))
         n = int.from_bytes(bl, byteorder='little')
         if n > 127:
             raise Error("Invalid version length")
-        remote_version = self.con.recv(n)
+        remote_version = bytes(self.recv_exact(n))
         if remote_version[-1] != 0x0a:
             raise Error("Invalid version message")
 
@@ -52,18 +94,47 @@ class PlainTransport:
 
     def send_msg(self, serialized):
         n = len(serialized)
-        bl = n.to_bytes(length=8, byteorder='little')
-        self.con.sendall(bl + serialized)
+        if n <= SMALL_MESSAGE_SIZE:
+            self.con.sendall(n.to_bytes(length=8, byteorder='little') + serialized)
+        else:
+            self.send_msgs((serialized,))
+
+    def send_msgs(self, messages):
+        """
+        Sends all messages, each prefixed with its length, using as few
+        system calls as possible and without copying the payloads.
+        """
+        buffers = []
+        for serialized in messages:
+            buffers.append(len(serialized).to_bytes(length=8, byteorder='little'))
+            buffers.append(serialized)
+        self.sendv(buffers)
+
+    def sendv(self, buffers):
+        """
+        Sends a list of buffers as one stream.  The list is modified.
+        """
+        if not hasattr(self.con, 'sendmsg'):  # Windows
+            self.con.sendall(b''.join(buffers))
+            return
+        i = 0
+        while i < len(buffers):
+            sent = self.con.sendmsg(buffers[i:i + IOV_MAX])
+            while i < len(buffers) and sent >= len(buffers[i]):
+                sent -= len(buffers[i])
+                i += 1
+            if sent > 0:
+                buffers[i] = memoryview(buffers[i])[sent:]
 
     def recv_msg(self):
-        bl = self.con.recv(8)
-        if len(bl) != 8:
-            raise EOFError
-        n = int.from_bytes(bl, 'little')
-        raw = self.con.recv(n)
-        if len(raw) != n:
-            raise EOFError
-        return raw
+        """
+        Returns the next message as a memoryview into the receive
+        buffer.  It must be consumed before the next call.
+        """
+        n = int.from_bytes(self.recv_exact(8), 'little')
+        if n > self.max_frame_size:
+            raise Error(f"Message of {n} bytes exceeds max_frame_size of {self.max_frame_size} bytes")
+        return self.recv_exact(n)
 
     def close(self):
         if self.con is not None:
@@ -74,23 +145,62 @@ class PlainTransport:
 class UnixTransport(PlainTransport):
     VERSION = "unix-v1@polypheny.com"
 
-    def __init__(self, path):
+    def __init__(self, path, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
         self.con = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         if path is None:
             path = os.path.expanduser("~/.polypheny/polypheny-prism.sock")
         self.con.connect(path)
+        self.init_buffer(max_frame_size)
         self.exchange_version(self.VERSION)
 
 
+class PendingResponse:
+    """
+    Handle for a request that was sent, but whose response might not
+    have arrived yet.  Responses are matched to their handle by the
+    request id, so they can arrive in any order.
+    """
+
+    def __init__(self, con, msg_id, field):
+        self.con = con
+        self.id = msg_id
+        self.field = field
+        self.response = None
+        self.error = None
+        self.done = False
+
+    def result(self):
+        """
+        Waits for the final response and returns the requested field of
+        it.  Raises :py:class:`~polypheny.Error` if the server reported
+        an error for this request.
+        """
+        if not self.done:
+            self.con.wait(self)
+        if self.error is not None:
+            raise self.error
+        if self.field is None:
+            return self.response
+        return getattr(self.response, self.field)
+
+
 class Connection:
     def __init__(self, address, transport, kwargs):
+        max_frame_size = kwargs.get('max_frame_size', DEFAULT_MAX_FRAME_SIZE)
         if transport == "plain":
-            self.con = PlainTransport(address)
+            self.con = PlainTransport(address, max_frame_size)
         elif transport == "unix":
-            self.con = UnixTransport(address)
+            self.con = UnixTransport(address, max_frame_size)
         else:
             raise Exception("Unknown transport: " + transport)
-        self.id = 1
+        self.ids = itertools.count(1)
+        self.pending = {}  # Request id -> PendingResponse
+        self.outbox = []  # Serialized requests not yet sent
+        # Reentrant, because destructors can close statements at any time
+        self.cond = threading.Condition(threading.RLock())
+        self.sending = None  # Thread currently sending
+        self.reader = None  # Thread currently receiving
+        self.broken = None  # Exception that made the connection unusable
 
     def close(self):
         if self.con is None:
@@ -100,37 +210,155 @@ class Connection:
         except Exception:
             pass
 
+        with self.cond:
+            try:
+                self.con.close()
+            except Exception:
+                pass
+            self.con = None
+            self.fail(Error("Connection is closed"))
+
+    def is_usable(self):
+        """
+        Checks that the connection was not closed by the server.  An
+        idle connection must not have anything to read, otherwise the
+        server hung up or the stream is out of sync.  Only the answers
+        of requests nobody waited for, like closing a statement, are
+        read first, there is no round trip otherwise.
+        """
+        with self.cond:
+            if self.con is None or self.broken is not None:
+                return False
+            if self.reader is not None or self.sending is not None:
+                return True  # In use by another thread
+            pending = list(self.pending.values())
         try:
-            self.con.close()
+            for p in pending:
+                self.wait(p)
         except Exception:
-            pass
-        self.con = None
+            return False
+        with self.cond:
+            if self.con is None or self.broken is not None:
+                return False
+            try:
+                readable, _, _ = select.select([self.con.con], [], [], 0)
+            except (OSError, ValueError):
+                return False
+            return not readable
 
     def new_request(self):
         msg = protointerface_pb2.Request()
-        msg.id = self.id
-        self.id += 1
+        msg.id = next(self.ids)
         return msg
 
-    def send_msg(self, msg):
-        self.con.send_msg(msg.SerializeToString())
-
-    def recv_msg(self):
-        r = protointerface_pb2.Response()
-        r.ParseFromString(self.con.recv_msg())
+    def submit(self, msg, field=None, flush=True):
+        """
+        Sends ``msg`` without waiting for its response.  With
+        ``flush=False`` the request is only queued and goes out together
+        with the next flushed one.
+        """
+        pending = PendingResponse(self, msg.id, field)
+        serialized = msg.SerializeToString()
+        with self.cond:
+            if self.broken is not None:
+                raise Error("Connection is unusable") from self.broken
+            self.pending[msg.id] = pending
+            self.outbox.append(serialized)
+        if flush:
+            self.flush()
+        return pending
+
+    def flush(self):
+        """
+        Sends the queued requests.  The lock is not held while sending,
+        so other threads can queue requests and receive in the meantime.
+        Requests queued by them are sent by the thread already sending.
+        """
+        with self.cond:
+            if self.sending is not None:
+                return
+            self.sending = threading.get_ident()
+        try:
+            while True:
+                with self.cond:
+                    msgs, self.outbox = self.outbox, []
+                    if not msgs:
+                        self.sending = None
+                        return
+                if len(msgs) == 1:
+                    self.con.send_msg(msgs[0])
+                else:
+                    self.con.send_msgs(msgs)
+        except BaseException as e:
+            with self.cond:
+                self.sending = None
+                self.fail(e)
+            raise
+
+    def wait(self, pending):
+        """
+        Receives responses until ``pending`` is done.  Only one thread
+        reads from the transport at a time, responses for other requests
+        are handed to their handles and their waiters are woken up.
+        """
+        if self.sending == threading.get_ident():
+            raise Error("Cannot wait for a response while sending")
+        self.flush()
+        with self.cond:
+            while not pending.done:
+                if self.reader is not None:
+                    if self.reader == threading.get_ident():
+                        raise Error("Cannot wait for a response while receiving")
+                    self.cond.wait()
+                    continue
+                self.reader = threading.get_ident()
+                self.cond.release()
+                try:
+                    r = protointerface_pb2.Response()
+                    r.ParseFromString(self.con.recv_msg())
+                except BaseException as e:
+                    self.cond.acquire()
+                    self.reader = None
+                    self.fail(e)
+                    self.cond.notify_all()
+                    raise
+                self.cond.acquire()
+                self.reader = None
+                self.dispatch(r)
+                self.cond.notify_all()
+
+    def dispatch(self, r):
+        pending = self.pending.get(r.id)
+        if pending is None:
+            self.fail(Error(f"Received response for unknown request {r.id}"))
+            return
         if r.WhichOneof('type') == 'error_response':
-            # TODO: Add to error_response something to decide if this is necessary
-            # self.con.close()
-            # self.con = None
-            raise Error(r.error_response.message)
-        return r
+            # TODO: Add to error_response something to decide if the connection is still usable
+            pending.error = Error(r.error_response.message)
+        else:
+            pending.response = r
+            if not r.last:
+                return
+        pending.done = True
+        del self.pending[r.id]
+
+    def fail(self, e):
+        if self.broken is None:
+            self.broken = e
+        for pending in self.pending.values():
+            pending.error = e
+            pending.done = True
+        self.pending.clear()
+        self.outbox.clear()
 
     def call(self, msg):
-        self.send_msg(msg)
-        response = self.recv_msg()
-        assert response.id == msg.id
-        assert response.last
-        return response
+        return self.submit(msg).result()
+
+    def request(self, msg, field, wait):
+        pending = self.submit(msg, field)
+        if wait:
+            return pending.result()
+        return pending
 
     def connect(self, username, password, auto_commit):
         msg = self.new_request()
@@ -143,29 +371,38 @@ class Connection:
         req.minor_api_version = POLYPHENY_API_MINOR
         req.connection_properties.is_auto_commit = auto_commit
 
-        return self.call(msg).connection_response
+        return self.request(msg, 'connection_response', True)
+
+    def update_connection_properties(self, auto_commit=None, namespace=None, wait=True):
+        msg = self.new_request()
+        props = msg.connection_properties_update_request.connection_properties
+        if auto_commit is not None:
+            props.is_auto_commit = auto_commit
+        if namespace is not None:
+            props.namespace_name = namespace
+        return self.request(msg, 'connection_properties_update_response', wait)
 
     def disconnect(self):
         msg = self.new_request()
         req = connection_requests_pb2.DisconnectRequest()
         msg.disconnect_request.MergeFrom(req)
 
-        return self.call(msg).disconnect_response
+        return self.request(msg, 'disconnect_response', True)
 
-    def commit(self):
+    def commit(self, wait=True):
         msg = self.new_request()
         req = transaction_requests_pb2.CommitRequest()
         msg.commit_request.MergeFrom(req)
 
-        return self.call(msg).commit_response
+        return self.request(msg, 'commit_response', wait)
 
-    def rollback(self):
+    def rollback(self, wait=True):
         msg = self.new_request()
         req = transaction_requests_pb2.RollbackRequest()
         msg.rollback_request.MergeFrom(req)
-        return self.call(msg).rollback_response
+        return self.request(msg, 'rollback_response', wait)
 
-    def execute_unparameterized_statement(self, language_name, statement, fetch_size, namespace):
+    def execute_unparameterized_statement(self, language_name, statement, fetch_size, namespace, wait=True):
         msg = self.new_request()
         req = statement_requests_pb2.ExecuteUnparameterizedStatementRequest()
         req.language_name = language_name
@@ -177,41 +414,59 @@ class Connection:
 
         msg.execute_unparameterized_statement_request.MergeFrom(req)
 
-        self.send_msg(msg)
-        self.recv_msg()
-        r = self.recv_msg()
-        assert r.id == msg.id
-        assert r.last
-        return r.statement_response
+        # The server first acknowledges the statement and then sends the
+        # result, the handle resolves to the last response
+        return self.request(msg, 'statement_response', wait)
 
-    def prepare_indexed_statement(self, language_name, statement, namespace):
+    def prepare_indexed_statement(self, language_name, statement, namespace, wait=True):
         msg = self.new_request()
         req = msg.prepare_indexed_statement_request
         req.language_name = language_name
         req.statement = statement
         if namespace:
             req.namespace_name = namespace
-        return self.call(msg).prepared_statement_signature
+        return self.request(msg, 'prepared_statement_signature', wait)
 
-    def execute_indexed_statement(self, statement_id, params, fetch_size):
+    def execute_indexed_statement(self, statement_id, params, fetch_size, wait=True):
         msg = self.new_request()
         req = msg.execute_indexed_statement_request
         req.statement_id = statement_id
         req.parameters.parameters.extend(list(map(py2proto, params)))
         if fetch_size:
             req.fetch_size = fetch_size
-        return self.call(msg).statement_result
+        return self.request(msg, 'statement_result', wait)
+
+    def execute_indexed_statement_batch(self, statement_id, params_batch, wait=True, encoders=None):
+        """
+        ``encoders`` has one function per parameter, like
+        :py:func:`~polypheny.serialize.py2proto`, used instead of
+        looking at the type of every value.
+        """
+        msg = self.new_request()
+        req = msg.execute_indexed_statement_batch_request
+        req.statement_id = statement_id
+        if encoders is None:
+            for params in params_batch:
+                parameters = req.parameters.add().parameters
+                for param in params:
+                    py2proto(param, parameters.add())
+        else:
+            for params in params_batch:
+                parameters = req.parameters.add().parameters
+                for encoder, param in zip(encoders, params):
+                    encoder(param, parameters.add())
+        return self.request(msg, 'statement_batch_response', wait)
 
-    def prepare_named_statement(self, language_name, statement, namespace):
+    def prepare_named_statement(self, language_name, statement, namespace, wait=True):
         msg = self.new_request()
         req = msg.prepare_named_statement_request
         req.language_name = language_name
         req.statement = statement
         if namespace:
             req.namespace_name = namespace
-        return self.call(msg).prepared_statement_signature
+        return self.request(msg, 'prepared_statement_signature', wait)
 
-    def execute_named_statement(self, statement_id, params, fetch_size):
+    def execute_named_statement(self, statement_id, params, fetch_size, wait=True):
         msg = self.new_request()
         req = msg.execute_named_statement_request
         req.statement_id = statement_id
@@ -219,18 +474,29 @@ class Connection:
             req.fetch_size = fetch_size
         for k, v in params.items():
             py2proto(v, req.parameters.parameters[k])
-        return self.call(msg).statement_result
+        return self.request(msg, 'statement_result', wait)
 
-    def fetch(self, statement_id, fetch_size):
+    def fetch(self, statement_id, fetch_size, wait=True):
         msg = self.new_request()
         req = msg.fetch_request
         req.statement_id = statement_id
         if fetch_size:
             req.fetch_size = fetch_size
 
-        return self.call(msg).frame
+        return self.request(msg, 'frame', wait)
 
-    def close_statement(self, statement_id):
+    def close_statement(self, statement_id, wait=True):
         msg = self.new_request()
         msg.close_statement_request.statement_id = statement_id
-        return self.call(msg).close_statement_response
+        if wait:
+            return self.request(msg, 'close_statement_response', True)
+        # Nobody waits for the answer, so the request can go out
+        # together with the next one
+        return self.submit(msg, 'close_statement_response', flush=False)
+
+    def close_result(self, statement_id, wait=True):
+        msg = self.new_request()
+        msg.close_result_request.statement_id = statement_id
+        if wait:
+            return self.request(msg, 'close_result_response', True)
+        return self.submit(msg, 'close_result_response', flush=False)
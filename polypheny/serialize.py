@@ -12,15 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import base64
 import datetime
 import decimal
+import json
+import math
+import operator
 from functools import reduce
+from json.encoder import encode_basestring
 
 import polypheny.interval as interval
 from org.polypheny.prism import value_pb2
+from polypheny.exceptions import ProgrammingError
 
 
 def serialize_big_decimal(v, value):
+    encode_decimal(value, v)
+
+
+def encode_decimal(value, v):
     sign, digits, exponent = value.as_tuple()
     sign = -2 * sign + 1
     unscaled = sign * reduce(lambda r, d: r * 10 + d, digits)
@@ -30,43 +40,91 @@ def serialize_big_decimal(v, value):
     v.big_decimal.scale = -exponent
 
 
-# See ProtoValueDeserializer
+def encode_bool(value, v):
+    v.boolean.boolean = value
+
+
+def encode_int(value, v):
+    if -2 ** 31 <= value <= 2 ** 31 - 1:
+        v.integer.integer = value
+    elif -2 ** 63 <= value <= 2 ** 63 - 1:
+        v.long.long = value
+    else:
+        encode_decimal(decimal.Decimal(value), v)
+
+
+def encode_float(value, v):
+    # TODO: Always use decimal?
+    v.double.double = value
+
+
+def encode_date(value, v):
+    diff = value - datetime.date(1970, 1, 1)
+    v.date.date = diff.days
+
+
+def encode_time(value, v):
+    v.time.time = (value.hour * 3600 + value.minute * 60 + value.second) * 1000 + value.microsecond * 10
+
+
+def encode_datetime(value, v):
+    v.timestamp.timestamp = int(value.timestamp() * 1000)
+
+
+def encode_str(value, v):
+    v.string.string = value
+
+
+def encode_bytes(value, v):
+    v.binary.binary = value
+
+
+def encode_null(value, v):
+    v.null.SetInParent()
+
+
+def encode_list(value, v):
+    values = v.list.values
+    for element in value:
+        py2proto(element, values.add())
+
+
+# Exact Python type -> function filling a ProtoValue, see ProtoValueDeserializer
+ENCODERS = {
+    bool: encode_bool,
+    int: encode_int,
+    float: encode_float,
+    decimal.Decimal: encode_decimal,
+    datetime.date: encode_date,
+    datetime.time: encode_time,
+    datetime.datetime: encode_datetime,
+    str: encode_str,
+    bytes: encode_bytes,
+    type(None): encode_null,
+    list: encode_list,
+}
+
+
+def register_encoder(cls, encoder):
+    """
+    Makes :py:func:`py2proto` serialize values of type ``cls`` with
+    ``encoder(value, v)``, which fills the ``ProtoValue`` ``v``.  The
+    type must match exactly, subclasses need their own entry.
+
+    >>> def encode_fraction(value, v):
+    ...     v.string.string = str(value)
+    >>> polypheny.serialize.register_encoder(fractions.Fraction, encode_fraction)  # doctest: +SKIP
+    """
+    ENCODERS[cls] = encoder
+
+
 def py2proto(value, v=None):
     if v is None:
         v = value_pb2.ProtoValue()
-    if type(value) is bool:
-        v.boolean.boolean = value
-    elif type(value) is int:
-        if -2 ** 31 <= value <= 2 ** 31 - 1:
-            v.integer.integer = value
-        elif -2 ** 63 <= value <= 2 ** 63 - 1:
-            v.long.long = value
-        else:
-            serialize_big_decimal(v, decimal.Decimal(value))
-    elif type(value) is float:
-        # TODO: Always use decimal?
-        v.double.double = value
-    elif type(value) is decimal.Decimal:
-        serialize_big_decimal(v, value)
-    elif type(value) is datetime.date:
-        diff = value - datetime.date(1970, 1, 1)
-        v.date.date = diff.days
-    elif type(value) is datetime.time:
-        v.time.time = (value.hour * 3600 + value.minute * 60 + value.second) * 1000 + value.microsecond * 10
-    elif type(value) is datetime.datetime:
-        v.timestamp.timestamp = int(value.timestamp() * 1000)
-    elif type(value) is str:
-        v.string.string = value
-    elif type(value) is bytes:
-        v.binary.binary = value
-    elif value is None:
-        v.null.CopyFrom(value_pb2.ProtoNull())
-    elif type(value) is list:
-        for element in value:
-            v.list.values.append(py2proto(element))
-    else:
+    encoder = ENCODERS.get(type(value))
+    if encoder is None:
         raise NotImplementedError
-
+    encoder(value, v)
     return v
 
 
@@ -81,52 +139,197 @@ def parse_big_decimal(value):
     return decimal.Decimal((sign, tuple(map(int, str(n))), -scale))
 
 
+def decode_date(value):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(days=value.date.date)
+
+
+def decode_time(value):
+    t = value.time.time
+    millis = t % 1000
+    t = t / 1000
+    hour = int(t / 3600)
+    t = t % 3600
+    minute = int(t / 60)
+    t = t % 60
+    second = int(t)
+    return datetime.time(hour, minute, second, microsecond=int(millis * 1000))
+
+
+def decode_timestamp(value):
+    return datetime.datetime.fromtimestamp(value.timestamp.timestamp / 1000, datetime.timezone.utc)
+
+
+def decode_interval(value):
+    return interval.IntervalMonthMilliseconds(value.interval.months, value.interval.milliseconds)
+
+
+def decode_list(value):
+    return decode_nested([], value.list.values)
+
+
+def decode_document(value):
+    return decode_nested({}, value.document.entries)
+
+
+def decode_nested(result, items):
+    """
+    Decodes the values of a ``ProtoList`` or the entries of a
+    ``ProtoDocument`` into ``result``, which is a list or a dict.
+    Nested lists and documents are handled with a stack instead of
+    recursion, so deep nesting does not hit the recursion limit.
+    """
+    decoders = DECODERS
+    stack = [(result, iter(items))]
+    while stack:
+        container, items = stack[-1]
+        if type(container) is dict:
+            for entry in items:
+                key = entry.key
+                key = key.string.string if key.WhichOneof('value') == 'string' else proto2py(key)
+                value = entry.value
+                field = value.WhichOneof('value')
+                if field == 'document':
+                    child = container[key] = {}
+                    stack.append((child, iter(value.document.entries)))
+                    break
+                elif field == 'list':
+                    child = container[key] = []
+                    stack.append((child, iter(value.list.values)))
+                    break
+                decoder = decoders.get(field)
+                container[key] = proto2py(value) if decoder is None else decoder(value)
+            else:
+                stack.pop()
+        else:
+            for value in items:
+                field = value.WhichOneof('value')
+                if field == 'document':
+                    child = {}
+                    container.append(child)
+                    stack.append((child, iter(value.document.entries)))
+                    break
+                elif field == 'list':
+                    child = []
+                    container.append(child)
+                    stack.append((child, iter(value.list.values)))
+                    break
+                decoder = decoders.get(field)
+                container.append(proto2py(value) if decoder is None else decoder(value))
+            else:
+                stack.pop()
+    return result
+
+
+# Name of the set ProtoValue field -> function returning the Python value
+DECODERS = {
+    'boolean': operator.attrgetter('boolean.boolean'),
+    'integer': operator.attrgetter('integer.integer'),
+    'long': operator.attrgetter('long.long'),
+    'big_decimal': lambda value: parse_big_decimal(value.big_decimal),
+    'float': operator.attrgetter('float.float'),
+    'double': operator.attrgetter('double.double'),
+    'date': decode_date,
+    'time': decode_time,
+    'timestamp': decode_timestamp,
+    'interval': decode_interval,
+    'string': operator.attrgetter('string.string'),
+    'binary': operator.attrgetter('binary.binary'),
+    'null': lambda value: None,
+    'list': decode_list,
+    'document': decode_document,
+}
+
+
+def json_float(value):
+    return repr(value) if math.isfinite(value) else 'null'
+
+
+def json_interval(value):
+    return f'{{"months":{value.interval.months},"milliseconds":{value.interval.milliseconds}}}'
+
+
+def json_other(value):
+    return json.dumps(proto2py(value), default=str)
+
+
+# Name of the set ProtoValue field -> function returning the JSON text,
+# lists and documents are handled by nested_json
+JSON_ENCODERS = {
+    'boolean': lambda value: 'true' if value.boolean.boolean else 'false',
+    'integer': lambda value: str(value.integer.integer),
+    'long': lambda value: str(value.long.long),
+    'big_decimal': lambda value: str(parse_big_decimal(value.big_decimal)),
+    'float': lambda value: json_float(value.float.float),
+    'double': lambda value: json_float(value.double.double),
+    'date': lambda value: f'"{decode_date(value).isoformat()}"',
+    'time': lambda value: f'"{decode_time(value).isoformat()}"',
+    'timestamp': lambda value: f'"{decode_timestamp(value).isoformat()}"',
+    'interval': json_interval,
+    'string': lambda value: encode_basestring(value.string.string),
+    'binary': lambda value: f'"{base64.b64encode(value.binary.binary).decode()}"',
+    'null': lambda value: 'null',
+}
+
+
+def nested_json(parts, items, is_document):
+    """
+    Appends the JSON text of the entries of a ``ProtoDocument``, or the
+    values of a ``ProtoList``, to the list ``parts``, without building
+    Python values in between and without recursion.  Dates and times
+    become ISO 8601 strings, binary values Base64 strings.
+    """
+    parts.append('{' if is_document else '[')
+    stack = [[is_document, iter(items), True]]  # Kind, items, no item written yet
+    while stack:
+        top = stack[-1]
+        is_document, items = top[0], top[1]
+        for item in items:
+            if top[2]:
+                top[2] = False
+            else:
+                parts.append(',')
+            if is_document:
+                key = item.key
+                parts.append(encode_basestring(key.string.string if key.WhichOneof('value') == 'string'
+                                               else str(proto2py(key))))
+                parts.append(':')
+                item = item.value
+            field = item.WhichOneof('value')
+            if field == 'document':
+                parts.append('{')
+                stack.append([True, iter(item.document.entries), True])
+                break
+            if field == 'list':
+                parts.append('[')
+                stack.append([False, iter(item.list.values), True])
+                break
+            encoder = JSON_ENCODERS.get(field, json_other)
+            parts.append(encoder(item))
+        else:
+            stack.pop()
+            parts.append('}' if is_document else ']')
+    return parts
+
+
+def register_decoder(name, decoder):
+    """
+    Makes :py:func:`proto2py` convert ``ProtoValue`` messages whose
+    ``value`` field ``name`` is set with ``decoder(value)``.  This
+    replaces the built-in conversion, for example to get naive
+    timestamps:
+
+    >>> def naive_timestamp(value):
+    ...     return datetime.datetime.utcfromtimestamp(value.timestamp.timestamp / 1000)
+    >>> polypheny.serialize.register_decoder('timestamp', naive_timestamp)  # doctest: +SKIP
+    """
+    if name not in {f.name for f in value_pb2.ProtoValue.DESCRIPTOR.oneofs_by_name['value'].fields}:
+        raise ProgrammingError(f"ProtoValue has no value field {name}")
+    DECODERS[name] = decoder
+
+
 def proto2py(value):
-    name = value.WhichOneof("value")
-    assert name is not None
-    if name == "boolean":
-        return value.boolean.boolean
-    elif name == "integer":
-        return value.integer.integer
-    elif name == "long":
-        return value.long.long
-    elif name == "big_decimal":
-        return parse_big_decimal(value.big_decimal)
-    elif name == "float":
-        return value.float.float
-    elif name == "double":
-        return value.double.double
-    elif name == "date":
-        return datetime.date(1970, 1, 1) + datetime.timedelta(days=value.date.date)
-    elif name == "time":
-        t = value.time.time
-        millis = t % 1000
-        t = t / 1000
-        hour = int(t / 3600)
-        t = t % 3600
-        minute = int(t / 60)
-        t = t % 60
-        second = int(t)
-        return datetime.time(hour, minute, second, microsecond=int(millis * 1000))
-    elif name == "timestamp":
-        return datetime.datetime.fromtimestamp(value.timestamp.timestamp / 1000, datetime.timezone.utc)
-    elif name == "interval":
-        return interval.IntervalMonthMilliseconds(value.interval.months, value.interval.milliseconds)
-    elif name == "string":
-        return value.string.string
-    elif name == "binary":
-        return value.binary.binary
-    elif name == "null":
-        return None
-    elif name == "list":
-        return list(map(lambda e: proto2py(e), value.list.values))
-    elif name == "document":
-        res = {}
-        for entry in value.document.entries:
-            k = proto2py(entry.key)
-            assert isinstance(k, str)  # TODO: Correct?
-            v = proto2py(entry.value)
-            res[k] = v
-        return res
-    else:
+    decoder = DECODERS.get(value.WhichOneof("value"))
+    if decoder is None:
+        assert value.WhichOneof("value") is not None
         raise RuntimeError("Unhandled value type")
+    return decoder(value)
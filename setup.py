@@ -79,4 +79,9 @@ setup(
     install_requires=[
         "polypheny-prism-api==1.9",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+        "arrow": ["pyarrow"],
+        "pandas": ["pandas"],
+    },
 )
@@ -0,0 +1,77 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sys
+
+import polypheny
+import polypheny.aio
+import pytest
+
+
+async def aio_connect():
+    if sys.platform == 'win32':
+        return await polypheny.aio.connect(('127.0.0.1', 20590), username='pa', password='', transport='plain')
+    else:
+        return await polypheny.aio.connect()
+
+
+def test_aio_execute():
+    async def main():
+        async with await aio_connect() as con:
+            cur = con.cursor()
+            await cur.execute('DROP TABLE IF EXISTS t')
+            await cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+            await cur.executemany('INSERT INTO t(id, a) VALUES (?, ?)', [(i, i * 2) for i in range(30)])
+            await con.commit()
+
+            await cur.execute('SELECT id, a FROM t ORDER BY id', fetch_size=7)
+            assert await cur.fetchmany(2) == [[0, 0], [1, 2]]
+            rows = [row async for row in cur]
+            assert len(rows) == 28
+
+            await cur.executeany('mongo', 'db.t.find({"id": 1})')
+            assert await cur.fetchone() == {'id': 1, 'a': 2}
+
+            with pytest.raises(polypheny.Error):
+                await cur.execute('SELECT * FROM does_not_exist')
+            await cur.close()
+
+    asyncio.run(main())
+
+
+def test_aio_concurrent_sessions():
+    async def session(i):
+        con = await aio_connect()
+        try:
+            cur = con.cursor()
+            await cur.execute('SELECT ?', (i,))
+            return (await cur.fetchone())[0]
+        finally:
+            await con.close()
+
+    async def main():
+        return await asyncio.gather(*(session(i) for i in range(20)))
+
+    assert asyncio.run(main()) == list(range(20))
+
+
+def test_aio_close_broken():
+    async def main():
+        con = await aio_connect()
+        await con.cursor().execute('SELECT 1')
+        con.con.fail(polypheny.Error('Connection lost'))
+        await con.close()
+
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import decimal
+
+import pytest
+
+from polypheny.columns import ArrowBuilder
+from polypheny.interval import IntervalMonthMilliseconds
+from org.polypheny.prism import relational_frame_pb2, value_pb2
+
+from test_helper import con, cur, cur_with_data
+
+pa = pytest.importorskip('pyarrow')
+
+
+def column_meta_of(type_code, element_code):
+    meta = relational_frame_pb2.ColumnMeta()
+    meta.type_meta.proto_value_type = value_pb2.ProtoPolyType.Value(type_code)
+    meta.type_meta.array_meta.element_type.proto_value_type = value_pb2.ProtoPolyType.Value(element_code)
+    return meta
+
+
+def test_arrow_builder():
+    description = [
+        ('i', 'INTEGER', None, None, None, 0, 0, False),
+        ('d', 'DECIMAL', None, None, None, 10, 2, True),
+        ('t', 'TIMESTAMP', None, None, None, 0, 0, True),
+        ('iv', 'INTERVAL', None, None, None, 0, 0, False),
+        ('l', 'ARRAY', None, None, None, 0, 0, False),
+    ]
+    column_meta = [None] * 4 + [column_meta_of('ARRAY', 'INTEGER')]
+    ts = datetime.datetime(2024, 5, 17, 13, 37, 42, 123000, tzinfo=datetime.timezone.utc)
+    builder = ArrowBuilder(description, column_meta)
+    b1 = builder.batch([[1, decimal.Decimal('1.5'), ts, IntervalMonthMilliseconds(1, 2), [1, 2]]])
+    b2 = builder.batch([[2, None, None, IntervalMonthMilliseconds(0, 5), [3]]])
+    table = builder.table([b1, b2])
+    assert table.schema.field('i').type == pa.int32()
+    assert not table.schema.field('i').nullable
+    assert table.schema.field('d').type == pa.decimal128(10, 2)
+    assert table.schema.field('t').type == pa.timestamp('ms', tz='UTC')
+    assert table.column('d').to_pylist() == [decimal.Decimal('1.50'), None]
+    assert table.column('t').to_pylist()[0] == ts
+    assert table.column('iv').to_pylist()[1].nanoseconds == 5000000
+    assert table.column('l').to_pylist() == [[1, 2], [3]]
+
+
+def test_arrow_builder_null_first_chunk():
+    description = [
+        ('doc', 'DOCUMENT', None, None, None, 0, 0, True),
+        ('l', 'ARRAY', None, None, None, 0, 0, True),
+        ('n', 'NULL', None, None, None, 0, 0, True),
+    ]
+    builder = ArrowBuilder(description)
+    b1 = builder.batch([[None, None, None]])
+    b2 = builder.batch([[{'a': 1}, [1, 'x'], None]])
+    assert b1.schema == b2.schema
+    table = builder.table([b1, b2])
+    assert table.schema.field('doc').type == pa.string()
+    assert table.schema.field('n').type == pa.null()
+    assert table.column('doc').to_pylist() == [None, '{"a": 1}']
+    assert table.column('l').to_pylist() == [None, '[1, "x"]']
+
+
+def test_fetch_arrow_table(cur_with_data):
+    cur = cur_with_data
+    cur.execute('SELECT id, name FROM customers ORDER BY id', fetch_size=3)
+    table = cur.fetch_arrow_table()
+    assert table.num_rows == 7
+    assert table.column('name').to_pylist()[0] == 'Maria'
+
+
+def test_iter_arrow_batches(cur_with_data):
+    cur = cur_with_data
+    cur.execute('SELECT id FROM customers ORDER BY id', fetch_size=3)
+    assert cur.fetchone() == [1]
+    batches = list(cur.iter_arrow_batches())
+    assert [b.num_rows for b in batches] == [2, 3, 1]
+    assert all(b.schema == batches[0].schema for b in batches)
@@ -0,0 +1,96 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import io
+
+import polypheny
+import polypheny.bulk
+import pytest
+
+from test_helper import con, cur, cur_with_data
+
+
+def test_csv_converter():
+    convert, encoders = polypheny.bulk.csv_converter(['i', 'b', 't', 's'], ['INTEGER', 'BOOLEAN', 'TIMESTAMP', 'VARCHAR'],
+                                                     '')
+    rows = list(convert([['1', 'true', '2024-05-17T13:37:42', 'a'], ['', 'F', '', '']]))
+    assert rows[0] == (1, True, datetime.datetime(2024, 5, 17, 13, 37, 42, tzinfo=datetime.timezone.utc), 'a')
+    assert rows[1] == (None, False, None, None)
+    assert len(encoders) == 4
+    with pytest.raises(polypheny.DataError):
+        convert([['x', 'true', '', '']])
+    with pytest.raises(polypheny.DataError):
+        convert([['1']])
+
+    convert, _ = polypheny.bulk.csv_converter(['d'], ['DECIMAL'], '')
+    with pytest.raises(polypheny.DataError, match='column d'):
+        convert([['1.2.3']])
+    convert, _ = polypheny.bulk.json_converter(['d'], ['DECIMAL'])
+    with pytest.raises(polypheny.DataError, match='column d'):
+        convert([{'d': 'x'}])
+
+
+def test_read_documents():
+    f = io.BytesIO(b'{"a": 1}\n\n{"b": [2]}\n')
+    assert list(polypheny.bulk.read_documents(f, 'utf-8')) == ['{"a": 1}', '{"b": [2]}']
+    f = io.BytesIO(b'{"a": 1}\n{"a": 2}]), db.x.drop(\n')
+    with pytest.raises(polypheny.DataError, match='at byte 9'):
+        list(polypheny.bulk.read_documents(f, 'utf-8'))
+    with pytest.raises(polypheny.DataError, match='Expected a JSON object'):
+        list(polypheny.bulk.read_documents(io.BytesIO(b'[1]\n'), 'utf-8'))
+
+
+def test_load_csv(con, cur_with_data, tmp_path):
+    cur = cur_with_data
+    path = tmp_path / 'customers.csv'
+    path.write_text('id,name,year_joined\n8,Eva,2020\n9,"Jan, Jr.",2021\n\n10,Lea,2022\n')
+    progress = []
+    n = polypheny.bulk.load_file(con, str(path), 'customers', chunk_rows=2, progress=lambda *a: progress.append(a))
+    assert n == 3
+    assert progress[-1] == (path.stat().st_size, path.stat().st_size, 3)
+    cur.execute('SELECT name FROM customers WHERE id > 7 ORDER BY id')
+    assert cur.fetchall() == [['Eva'], ['Jan, Jr.'], ['Lea']]
+
+
+def test_load_csv_resume(con, cur_with_data, tmp_path):
+    cur = cur_with_data
+    path = tmp_path / 'customers.csv'
+    path.write_text('id,name,year_joined\n8,Eva,2020\n9,Jan,2021\n1,Maria,2012\n10,Lea,2022\n')
+    with pytest.raises(polypheny.Error) as e:
+        polypheny.bulk.load_file(con, str(path), 'customers', chunk_rows=1, commit=True)
+    # The rows before the window of the failed chunk are committed
+    cur.execute('SELECT COUNT(*) FROM customers')
+    assert cur.fetchone() == [7]
+    assert e.value.offset == len('id,name,year_joined\n')
+    path.write_text('id,name,year_joined\n8,Eva,2020\n9,Jan,2021\n11,Maria,2012\n10,Lea,2022\n')
+    assert polypheny.bulk.load_file(con, str(path), 'customers', offset=e.value.offset, commit=True) == 4
+    cur.execute('SELECT COUNT(*) FROM customers')
+    assert cur.fetchone() == [11]
+
+
+def test_load_ndjson(con, cur_with_data, tmp_path):
+    cur = cur_with_data
+    path = tmp_path / 'customers.ndjson'
+    path.write_text('{"id": 8, "name": "Eva", "year_joined": 2020}\n{"year_joined": 2021, "name": "Jan", "id": 9}\n')
+    assert polypheny.bulk.load_file(con, str(path), 'customers', 'ndjson') == 2
+    cur.execute('SELECT name FROM customers WHERE id > 7 ORDER BY id')
+    assert cur.fetchall() == [['Eva'], ['Jan']]
+
+
+def test_load_bad_format(con, tmp_path):
+    with pytest.raises(polypheny.ProgrammingError):
+        polypheny.bulk.load_file(con, str(tmp_path / 'x.xml'), 'customers', 'xml')
+    with pytest.raises(polypheny.NotSupportedError):
+        polypheny.bulk.load_file(con, str(tmp_path / 'x.csv'), 'customers', lang='mongo')
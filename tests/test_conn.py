@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+
 import polypheny
 import pytest
 import time
@@ -44,6 +46,21 @@ def test_rollback(con):
     cur.execute('SELECT a FROM t')
     assert cur.fetchone() is None
 
+def test_autocommit(con):
+    assert not con.autocommit
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+    con.autocommit = True
+    cur.execute('INSERT INTO t(id, a) VALUES (1, 2)')
+    con.rollback()
+    con.autocommit = False
+    cur.execute('INSERT INTO t(id, a) VALUES (2, 3)')
+    con.rollback()
+
+    cur.execute('SELECT id FROM t')
+    assert cur.fetchall() == [[1]]
+
 def test_fetch_size(con):
     cur = con.cursor()
 
@@ -108,3 +125,237 @@ def test_invalid_version():
             polypheny.connect(('127.0.0.1', 20590), username='pa', password='', transport='plain')
     finally:
         rpc.POLYPHENY_API_MAJOR = major
+
+def test_statement_cache(con):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+    cache = con.statement_cache
+    hits, misses = cache.hits, cache.misses
+    for i in range(5):
+        cur.execute('INSERT INTO t(id, a) VALUES (?, ?)', (i, i))
+    assert cache.misses == misses + 1
+    assert cache.hits == hits + 4
+
+    # The same query on two cursors with open results
+    cur2 = con.cursor()
+    cur.execute('SELECT a FROM t WHERE id >= ? ORDER BY id', (0,), fetch_size=1)
+    cur2.execute('SELECT a FROM t WHERE id >= ? ORDER BY id', (0,), fetch_size=1)
+    assert cur.fetchone() == [0]
+    assert cur2.fetchall() == [[i] for i in range(5)]
+    assert cur.fetchall() == [[i] for i in range(1, 5)]
+
+def test_statement_cache_release_once(con):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+    query = 'INSERT INTO t(id, a) VALUES (?, ?)'
+    cur.execute(query, (1, 1))
+    cache = con.statement_cache
+    # Another cursor takes the statement while the first still has its result
+    signature = cache.acquire(('sql', query, None, True))
+    assert signature is not None
+    cur.close()
+    assert signature.statement_id in cache.in_use
+    assert cache.acquire(('sql', query, None, True)) is None
+    cache.release(signature.statement_id)
+
+def test_statement_cache_schema_change(cur):
+    query = 'SELECT a FROM t WHERE id = ?'
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+    cur.execute('INSERT INTO t(id, a) VALUES (1, 1)')
+    cur.execute(query, (1,))
+    assert cur.fetchall() == [[1]]
+    cur.execute('DROP TABLE t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, b INTEGER, a VARCHAR(10))')
+    cur.execute("INSERT INTO t(id, b, a) VALUES (1, 2, 'x')")
+    try:
+        cur.execute(query, (1,))
+    except polypheny.Error:
+        # A stale statement fails once and is not used again
+        cur.execute(query, (1,))
+    assert cur.fetchall() == [['x']]
+
+def test_statement_cache_eviction():
+    if sys.platform == 'win32':
+        con = polypheny.connect(('127.0.0.1', 20590), username='pa', password='', transport='plain', statement_cache_size=2)
+    else:
+        con = polypheny.connect(statement_cache_size=2)
+    try:
+        cur = con.cursor()
+        for i in range(5):
+            cur.execute(f'SELECT ? + {i}', (1,))
+            assert cur.fetchone()[0] == 1 + i
+        assert len(con.statement_cache) == 2
+    finally:
+        con.close()
+
+def test_executemany_batches(cur):
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)')
+    cur.executemany('INSERT INTO t(id, a) VALUES (?, ?)', [(i, i) for i in range(10)], batch_size=3)
+    assert cur.rowcount == 10
+    cur.execute('SELECT COUNT(*) FROM t')
+    assert cur.fetchone()[0] == 10
+
+def test_executemany_failing_batch(cur):
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)')
+    with pytest.raises(polypheny.Error, match='Batch 1 with rows 4 to 7'):
+        cur.executemany('INSERT INTO t(id, a) VALUES (?, ?)',
+                        [(i, None if i == 5 else i) for i in range(10)], batch_size=4)
+    assert cur.rowcount == 4
+
+def test_executescript(cur):
+    rowcounts = cur.executescript('sql', [
+        'DROP TABLE IF EXISTS t',
+        'CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)',
+        'INSERT INTO t(id, a) VALUES (1, 1), (2, 2)',
+        'SELECT * FROM t',
+        'UPDATE t SET a = 3 WHERE id = 2',
+    ])
+    assert rowcounts[2:] == [2, -1, 1]
+    assert cur.rowcount == 3
+    cur.execute('SELECT a FROM t ORDER BY id')
+    assert cur.fetchall() == [[1], [3]]
+
+def test_executescript_failing_statement(cur):
+    with pytest.raises(polypheny.Error, match='Statement 2 failed') as e:
+        cur.executescript('sql', [
+            'DROP TABLE IF EXISTS t',
+            'CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)',
+            'INSERT INTO t(id, a) VALUES (1, NULL)',
+        ])
+    assert e.value.index == 2
+    with pytest.raises(polypheny.ProgrammingError):
+        cur.executescript('sql', 'SELECT 1')
+
+def test_executescript_window(cur):
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)')
+    with pytest.raises(polypheny.Error, match='Statement 1 failed') as e:
+        cur.executescript('sql', [
+            'INSERT INTO t(id, a) VALUES (1, 1)',
+            'INSERT INTO t(id, a) VALUES (2, NULL)',
+            'INSERT INTO t(id, a) VALUES (3, 3)',
+        ], window=1)
+    assert e.value.index == 1
+    assert cur.rowcount == 1
+    cur.execute('SELECT id FROM t WHERE id > 1')
+    assert cur.fetchall() == []
+    with pytest.raises(polypheny.ProgrammingError):
+        cur.executescript('sql', ['SELECT 1'], window=0)
+
+def test_batch(con):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)')
+    with con.batch() as batch:
+        batch.execute('INSERT INTO t(id, a) VALUES (?, ?)', (1, 1))
+        batch.execute('INSERT INTO t(id, a) VALUES (?, ?)', (2, 2))
+        batch.execute('UPDATE t SET a = ? WHERE id = ?', (3, 2))
+        batch.execute('DELETE FROM t WHERE id = ?', (5,))
+        assert len(batch) == 4
+    assert batch.rowcounts == [1, 1, 1, 0]
+    assert con.open_batch is None
+    cur.execute('SELECT a FROM t ORDER BY id')
+    assert cur.fetchall() == [[1], [3]]
+
+def test_batch_failing_statement(con):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER NOT NULL)')
+    with pytest.raises(polypheny.Error, match='Statement 1 failed') as e:
+        with con.batch() as batch:
+            batch.execute('INSERT INTO t(id, a) VALUES (?, ?)', (1, 1))
+            batch.execute('UPDATE t SET a = ? WHERE id = ?', (None, 1))
+    assert e.value.index == 1
+    cur.execute('SELECT COUNT(*) FROM t')
+    assert cur.fetchone()[0] == 0
+
+def test_prefetch(cur):
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY)')
+    cur.executemany('INSERT INTO t(id) VALUES (?)', [(i,) for i in range(50)])
+    cur.execute('SELECT id FROM t ORDER BY id', fetch_size=4, prefetch=2)
+    assert cur.fetchmany(6) == [[i] for i in range(6)]
+    assert cur.fetchall() == [[i] for i in range(6, 50)]
+
+    # Closing the result early stops the helper thread
+    cur.execute('SELECT id FROM t ORDER BY id', fetch_size=4, prefetch=2)
+    assert cur.fetchone() == [0]
+    prefetcher = cur.result.prefetcher
+    cur.execute('SELECT COUNT(*) FROM t')
+    assert not prefetcher.thread.is_alive()
+    assert cur.fetchone() == [50]
+
+def test_fetch_size_tuner(cur):
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY)')
+    cur.executemany('INSERT INTO t(id) VALUES (?)', [(i,) for i in range(200)])
+    tuner = polypheny.FetchSizeTuner(2, target_bytes=1 << 20)
+    cur.execute('SELECT id FROM t ORDER BY id', fetch_size=tuner)
+    assert cur.fetchall() == [[i] for i in range(200)]
+    sizes = [size for size, _, _, _ in tuner.history]
+    assert sizes[:3] == [2, 8, 32]
+    assert tuner.history[0][3] is None
+    assert all(seconds > 0 for _, _, _, seconds in list(tuner.history)[1:])
+
+def test_fetch_size_tuner_shrinks():
+    from org.polypheny.prism import protointerface_pb2
+    tuner = polypheny.FetchSizeTuner(1000, target_bytes=1000)
+    frame = protointerface_pb2.Response().frame
+    for i in range(100):
+        frame.relational_frame.rows.add().values.add().string.string = 'x' * 100
+    tuner.observe(1000, frame, None)
+    assert tuner.size < 100
+    tuner = polypheny.FetchSizeTuner(1000, max_latency=0.01)
+    tuner.observe(1000, frame, 1.0)
+    assert tuner.size == 1
+
+class RecordingRpc:
+    broken = None
+
+    def __init__(self):
+        self.calls = []
+
+    def close_statement(self, statement_id, wait=True):
+        self.calls.append(('close_statement', statement_id, wait))
+
+    def close_result(self, statement_id, wait=True):
+        self.calls.append(('close_result', statement_id, wait))
+
+
+class StubConnection:
+    def __init__(self):
+        self.con = RecordingRpc()
+        self.statement_cache = polypheny.connection.StatementCache(4)
+
+
+def test_graph_result_is_discarded():
+    from types import SimpleNamespace
+    from org.polypheny.prism import protointerface_pb2
+    frame = protointerface_pb2.Response().frame
+    frame.graph_frame.SetInParent()
+    results = []
+
+    class ResultCursor(polypheny.connection.ResultCursor):
+        def discard(self):
+            results.append(self)
+            return super().discard()
+
+    con = StubConnection()
+    with pytest.raises(polypheny.NotSupportedError):
+        ResultCursor(con, 7, frame, None)
+    assert results[0].closed and results[0].con is None
+    assert con.con.calls == [('close_statement', 7, False)]
+
+    # A cached statement stays prepared, only its result is freed
+    con = StubConnection()
+    con.statement_cache.add(con.con, ('cypher', 'MATCH (n) RETURN n', None, True), SimpleNamespace(statement_id=8))
+    with pytest.raises(polypheny.NotSupportedError):
+        ResultCursor(con, 8, frame, None)
+    assert results[1].closed
+    assert con.con.calls == [('close_result', 8, False)]
+    assert 8 not in con.statement_cache.in_use
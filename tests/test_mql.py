@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+
 import polypheny
+import pytest
+import polypheny.rows
 
 from test_helper import con, cur
 
@@ -35,3 +39,28 @@ def test_namespace(con):
     con.commit()
     cur.executeany('mongo', 'db.t.find()', namespace='demo')
     assert list(sorted(cur.fetchall(), key=lambda a: a['i'] )) == [{'i': 0, 'a': 1}, {'i': 1, 'a': 2}, {'i': 2, 'a': 3}]
+
+def test_ndjson(con):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(i INTEGER NOT NULL, a INTEGER NOT NULL, PRIMARY KEY(i))')
+    cur.executemany('INSERT INTO t(i, a) VALUES (?, ?)', [(0, 1), (1, 2), (2, 3)])
+    con.commit()
+    cur.document_factory = polypheny.rows.ndjson_document
+    cur.executeany('mongo', 'db.t.find()', fetch_size=2)
+    lines = b''.join(cur.iter_ndjson()).splitlines()
+    assert sorted(map(json.loads, lines), key=lambda a: a['i']) == [{'i': 0, 'a': 1}, {'i': 1, 'a': 2}, {'i': 2, 'a': 3}]
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_paging(con, prefetch):
+    cur = con.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t(i INTEGER NOT NULL, PRIMARY KEY(i))')
+    cur.executemany('INSERT INTO t(i) VALUES (?)', [(i,) for i in range(7)])
+    con.commit()
+    cur.executeany('mongo', 'db.t.find()', fetch_size=1, prefetch=prefetch)
+    first = cur.fetchone()
+    docs = [first] + cur.fetchmany(2) + cur.fetchall()
+    assert sorted(doc['i'] for doc in docs) == list(range(7))
+    assert cur.fetchone() is None
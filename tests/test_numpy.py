@@ -0,0 +1,78 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import decimal
+
+import polypheny
+import pytest
+
+from polypheny.columns import NumpyBuilder
+
+from test_helper import con, cur, cur_with_data
+
+np = pytest.importorskip('numpy')
+
+
+def test_numpy_builder():
+    description = [
+        ('i', 'INTEGER', None, None, None, 0, 0, False),
+        ('n', 'BIGINT', None, None, None, 0, 0, True),
+        ('t', 'TIMESTAMP', None, None, None, 0, 0, True),
+        ('d', 'DECIMAL', None, None, None, 0, 0, False),
+        ('l', 'ARRAY', None, None, None, 0, 0, False),
+    ]
+    ts = datetime.datetime(2024, 5, 17, 13, 37, 42, 123000, tzinfo=datetime.timezone.utc)
+    builder = NumpyBuilder(description)
+    builder.add([[1, None, ts, decimal.Decimal('1.5'), [1, 2]]])
+    builder.add([[2, 7, None, decimal.Decimal('2'), [3]]])
+    columns = builder.result()
+    assert columns['i'].dtype == np.int32
+    assert list(columns['i']) == [1, 2]
+    assert isinstance(columns['n'], np.ma.MaskedArray)
+    assert list(columns['n'].mask) == [True, False]
+    assert columns['n'][1] == 7
+    assert columns['t'].dtype == np.dtype('datetime64[ms]')
+    assert columns['t'][0] == np.datetime64('2024-05-17T13:37:42.123')
+    assert list(columns['t'].mask) == [False, True]
+    assert columns['d'].dtype == object
+    assert list(columns['l']) == [[1, 2], [3]]
+
+
+def test_numpy_builder_empty():
+    builder = NumpyBuilder([('i', 'INTEGER', None, None, None, 0, 0, False)])
+    columns = builder.result()
+    assert len(columns['i']) == 0
+    assert columns['i'].dtype == np.int32
+
+
+def test_numpy_builder_duplicate_names():
+    builder = NumpyBuilder([('id', 'INTEGER', None, None, None, 0, 0, False),
+                            ('id', 'BIGINT', None, None, None, 0, 0, False)])
+    builder.add([[1, 2]])
+    assert [list(a) for a in builder.arrays()] == [[1], [2]]
+    with pytest.raises(polypheny.ProgrammingError, match="Duplicate column name 'id'"):
+        builder.result()
+
+
+def test_fetch_numpy(cur_with_data):
+    cur = cur_with_data
+    cur.execute('SELECT id, name, year_joined FROM customers ORDER BY id', fetch_size=3)
+    assert cur.fetchone() == [1, 'Maria', 2012]
+    columns = cur.fetchmany_numpy(4)
+    assert list(columns['id']) == [2, 3, 4, 5]
+    assert list(columns['name']) == ['Daniel', 'Peter', 'Anna', 'Thomas']
+    columns = cur.fetch_numpy()
+    assert list(columns['year_joined']) == [2014, 2010]
+    assert cur.fetchone() is None
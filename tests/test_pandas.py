@@ -0,0 +1,88 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import polypheny
+import pytest
+
+from test_helper import con, cur, cur_with_data
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+
+import polypheny.pandas
+from polypheny.interval import IntervalMonthMilliseconds
+
+
+def test_to_series():
+    ints = np.ma.MaskedArray(np.array([1, 0], 'int32'), [False, True])
+    assert polypheny.pandas.to_series(pd, np, ints, 'INTEGER', None).dtype == np.float64
+    s = polypheny.pandas.to_series(pd, np, ints, 'INTEGER', 'numpy_nullable')
+    assert s.dtype == pd.Int32Dtype()
+    assert s.isna().tolist() == [False, True]
+    ts = np.array(['2024-05-17T13:37:42.123'], 'datetime64[ms]')
+    assert str(polypheny.pandas.to_series(pd, np, ts, 'TIMESTAMP', None).dt.tz) == 'UTC'
+    intervals = np.empty(2, object)
+    intervals[:] = [IntervalMonthMilliseconds(0, 5), None]
+    assert polypheny.pandas.to_series(pd, np, intervals, 'INTERVAL', None).dtype == np.dtype('timedelta64[ms]')
+
+
+class StubResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def chunks(self, size):
+        yield self.rows
+
+
+class StubCursor:
+    def __init__(self, description, rows):
+        self.description = description
+        self.result = StubResult(rows)
+
+    def check_result(self):
+        pass
+
+
+def test_build_duplicate_names():
+    cur = StubCursor([('id', 'INTEGER', None, None, None, 0, 0, False),
+                      ('id', 'VARCHAR', None, None, None, 0, 0, False)], [[1, 'a'], [2, 'a']])
+    df = polypheny.pandas.build(pd, cur, None, None, 0.5)
+    assert list(df.columns) == ['id', 'id']
+    assert df.iloc[:, 0].tolist() == [1, 2]
+    assert df.iloc[:, 1].dtype == 'category'
+
+
+def test_read_sql(con, cur_with_data):
+    df = polypheny.pandas.read_sql(con, 'SELECT id, name FROM customers ORDER BY id', fetch_size=3)
+    assert df['id'].tolist() == [1, 2, 3, 4, 5, 6, 7]
+    assert df['name'][0] == 'Maria'
+    assert len(con.cursors) == 1  # Only the one of the fixture
+
+
+def test_read_sql_chunks(con, cur_with_data):
+    chunks = list(polypheny.pandas.read_sql(con, 'SELECT id FROM customers ORDER BY id', chunksize=3))
+    assert [len(df) for df in chunks] == [3, 3, 1]
+    assert chunks[2]['id'].tolist() == [7]
+
+
+def test_read_sql_categorical(con, cur_with_data):
+    df = polypheny.pandas.read_sql(con, 'SELECT year_joined, name FROM customers', categorical=0.5)
+    assert df['name'].dtype != 'category'
+    df = polypheny.pandas.read_sql(con, "SELECT CAST('a' AS VARCHAR(1)) AS c FROM customers", categorical=0.5)
+    assert df['c'].dtype == 'category'
+
+
+def test_read_sql_bad_backend(con):
+    with pytest.raises(polypheny.ProgrammingError):
+        polypheny.pandas.read_sql(con, 'SELECT 1', dtype_backend='numpy')
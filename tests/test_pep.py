@@ -843,6 +843,16 @@ def test_binary():
 # `ROWID`_ type
 #     This type object is used to describe the "Row ID" column in a
 #     database.
+def test_type_objects(cur):
+    assert polypheny.STRING == 'VARCHAR'
+    assert polypheny.NUMBER != 'VARCHAR'
+    assert polypheny.DATETIME == 'TIMESTAMP'
+    cur.execute("SELECT 1, CAST('a' AS VARCHAR(5)), CAST(1.5 AS DECIMAL(3, 1)), DATE '2024-01-01'")
+    types = [d[1] for d in cur.description]
+    assert types[0] == polypheny.NUMBER
+    assert types[1] == polypheny.STRING
+    assert types[2] == polypheny.NUMBER
+    assert types[3] == polypheny.DATETIME
 # 
 # 
 # SQL ``NULL`` values are represented by the Python ``None`` singleton
@@ -0,0 +1,150 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import sys
+import threading
+
+import polypheny
+import pytest
+
+from polypheny import rpc
+from org.polypheny.prism import protointerface_pb2
+
+VERSION = rpc.PlainTransport.VERSION.encode() + b'\n'
+
+
+def recv_exact(c, n):
+    buf = b''
+    while len(buf) < n:
+        chunk = c.recv(n - len(buf))
+        if not chunk:
+            raise EOFError
+        buf += chunk
+    return buf
+
+
+def reversing_peer(n):
+    """
+    Starts a fake server that collects ``n`` requests and answers them
+    in reverse order.  Fetch requests for statement 13 fail.  Returns
+    the address and the thread of the server, which ends when the
+    client hangs up.
+    """
+    server = socket.create_server(('127.0.0.1', 0))
+
+    def run():
+        try:
+            c, _ = server.accept()
+            with c:
+                c.sendall(bytes([len(VERSION)]) + VERSION)
+                recv_exact(c, len(VERSION) + 1)
+                requests = []
+                for _ in range(n):
+                    size = int.from_bytes(recv_exact(c, 8), 'little')
+                    msg = protointerface_pb2.Request()
+                    msg.ParseFromString(recv_exact(c, size))
+                    requests.append(msg)
+                for msg in reversed(requests):
+                    r = protointerface_pb2.Response()
+                    r.id = msg.id
+                    r.last = True
+                    if msg.fetch_request.statement_id == 13:
+                        r.error_response.message = 'no such statement'
+                    else:
+                        r.frame.is_last = True
+                        r.frame.relational_frame.rows.add().values.add().integer.integer = \
+                            msg.fetch_request.statement_id
+                    data = r.SerializeToString()
+                    c.sendall(len(data).to_bytes(8, 'little') + data)
+                c.recv(1)
+        except (EOFError, OSError):
+            pass  # The client hung up early
+        finally:
+            server.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return server.getsockname(), thread
+
+
+def value(frame):
+    return frame.relational_frame.rows[0].values[0].integer.integer
+
+
+def test_out_of_order_responses():
+    address, peer = reversing_peer(4)
+    con = rpc.Connection(address, 'plain', {})
+    try:
+        handles = [con.fetch(i, None, wait=False) for i in (10, 11, 12)]
+        handles.append(con.fetch(13, None, wait=False))
+        assert value(handles[0].result()) == 10
+        assert all(h.done for h in handles)
+        assert value(handles[2].result()) == 12
+        assert value(handles[1].result()) == 11
+        with pytest.raises(polypheny.Error):
+            handles[3].result()
+    finally:
+        con.con.close()
+        peer.join()
+
+
+def test_waiters_on_threads():
+    address, peer = reversing_peer(8)
+    con = rpc.Connection(address, 'plain', {})
+    results = {}
+
+    def work(i):
+        results[i] = value(con.fetch(i, None))
+
+    try:
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == {i: i for i in range(8)}
+    finally:
+        con.con.close()
+        peer.join()
+
+
+def test_connection_lost():
+    address, peer = reversing_peer(2)
+    con = rpc.Connection(address, 'plain', {})
+    try:
+        first = con.fetch(1, None, wait=False)
+        con.con.con.shutdown(socket.SHUT_RD)
+        with pytest.raises(EOFError):
+            first.result()
+        with pytest.raises(polypheny.Error):
+            con.fetch(2, None)
+    finally:
+        con.con.close()
+        peer.join()
+
+
+def test_pipelining():
+    if sys.platform == 'win32':
+        con = polypheny.connect(('127.0.0.1', 20590), username='pa', password='', transport='plain', pipelining=True)
+    else:
+        con = polypheny.connect(pipelining=True)
+    try:
+        cur = con.cursor()
+        for i in range(5):
+            cur.execute('SELECT ?', (i,))
+            assert cur.fetchone()[0] == i
+        cur.close()
+    finally:
+        con.close()
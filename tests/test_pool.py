@@ -0,0 +1,149 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import sys
+import threading
+
+import polypheny
+import polypheny.pool
+import pytest
+
+
+@pytest.fixture
+def pool():
+    if sys.platform == 'win32':
+        pool = polypheny.pool.ConnectionPool(('127.0.0.1', 20590), username='pa', password='', transport='plain',
+                                             min_size=1, max_size=2, timeout=1)
+    else:
+        pool = polypheny.pool.ConnectionPool(min_size=1, max_size=2, timeout=1)
+    yield pool
+    pool.close()
+
+
+def test_pool_reuse(pool):
+    with pool.connection() as con:
+        first = con
+    with pool.connection() as con:
+        assert con is first
+
+
+def test_pool_timeout(pool):
+    a = pool.getconn()
+    b = pool.getconn()
+    with pytest.raises(polypheny.OperationalError):
+        pool.getconn(timeout=0.1)
+    pool.putconn(a)
+    pool.putconn(b)
+
+
+def test_pool_reset(pool):
+    with pool.connection() as con:
+        cur = con.cursor()
+        cur.execute('DROP TABLE IF EXISTS t')
+        cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+        cur.execute('INSERT INTO t(id, a) VALUES (1, 2)')
+        cur.execute('SELECT a FROM t')
+    assert len(con.cursors) == 0
+
+    with pool.connection() as con:
+        cur = con.cursor()
+        cur.execute('SELECT a FROM t')
+        assert cur.fetchone() is None
+
+
+def test_pool_autocommit(pool):
+    with pool.connection() as con:
+        con.autocommit = True
+        cur = con.cursor()
+        cur.execute('DROP TABLE IF EXISTS t')
+        cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+        cur.execute('INSERT INTO t(id, a) VALUES (1, 2)')
+
+    with pool.connection() as con:
+        assert not con.autocommit
+        cur = con.cursor()
+        cur.execute('SELECT a FROM t')
+        assert cur.fetchone()[0] == 2
+
+
+def test_pool_open_batch(pool):
+    with pool.connection() as con:
+        cur = con.cursor()
+        cur.execute('DROP TABLE IF EXISTS t')
+        cur.execute('CREATE TABLE t(id INTEGER PRIMARY KEY, a INTEGER)')
+        con.autocommit = True
+        batch = con.batch()
+        batch.execute('INSERT INTO t(id, a) VALUES (?, ?)', (1, 2))
+
+    assert batch.con is None
+    with pool.connection() as con:
+        assert con.open_batch is None
+        with con.batch() as batch:
+            batch.execute('INSERT INTO t(id, a) VALUES (?, ?)', (2, 3))
+        cur = con.cursor()
+        cur.execute('SELECT id FROM t')
+        assert cur.fetchall() == [[2]]
+
+
+def test_pool_discards_dead(pool):
+    with pool.connection() as dead:
+        dead.con.con.con.shutdown(socket.SHUT_RDWR)
+        with pytest.raises(Exception):
+            dead.cursor().execute('SELECT 1')
+    with pool.connection() as con:
+        assert con is not dead
+        cur = con.cursor()
+        cur.execute('SELECT 1')
+        assert cur.fetchone()[0] == 1
+
+
+def test_pool_discards_dead_with_queued_close():
+    if sys.platform == 'win32':
+        pool = polypheny.pool.ConnectionPool(('127.0.0.1', 20590), username='pa', password='', transport='plain',
+                                             max_size=1, timeout=1, pipelining=True, autocommit=True)
+    else:
+        pool = polypheny.pool.ConnectionPool(max_size=1, timeout=1, pipelining=True, autocommit=True)
+    try:
+        with pool.connection() as dead:
+            cur = dead.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+        assert dead.con.pending  # The close is not waited for
+        dead.con.con.con.shutdown(socket.SHUT_RDWR)
+        with pool.connection() as con:
+            assert con is not dead
+    finally:
+        pool.close()
+
+
+def test_pool_threads(pool):
+    errors = []
+
+    def work():
+        try:
+            for _ in range(10):
+                with pool.connection(timeout=10) as con:
+                    cur = con.cursor()
+                    cur.execute('SELECT 1')
+                    assert cur.fetchone()[0] == 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
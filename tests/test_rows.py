@@ -0,0 +1,156 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import json
+
+import polypheny
+import pytest
+
+import polypheny.rows
+from polypheny.connection import RowDecoder, describe
+from org.polypheny.prism import protointerface_pb2, value_pb2
+
+from test_helper import con, cur, cur_with_data
+
+
+def make_frame():
+    frame = protointerface_pb2.Response().frame
+    rf = frame.relational_frame
+    for name, t in (('id', 'INTEGER'), ('name', 'VARCHAR')):
+        cm = rf.column_meta.add()
+        cm.column_label = name
+        cm.is_nullable = True
+        cm.type_meta.proto_value_type = value_pb2.ProtoPolyType.Value(t)
+    row = rf.rows.add()
+    row.values.add().integer.integer = 1
+    row.values.add().string.string = 'Orange'
+    row = rf.rows.add()
+    row.values.add().integer.integer = 2
+    row.values.add().null.SetInParent()
+    return frame
+
+
+def test_lazy_row():
+    frame = make_frame()
+    make = polypheny.rows.lazy_row(RowDecoder(frame.relational_frame.column_meta), describe(frame.relational_frame))
+    first, second = make(frame)
+    assert first.cells is None
+    assert first['name'] == 'Orange'
+    assert first.cells[0] is polypheny.rows.UNSET
+    assert first[0] == 1
+    assert first[-1] == 'Orange'
+    assert first[:1] == [1]
+    assert second == [2, None]
+    assert tuple(second) == (2, None)
+    assert len(second) == 2
+    with pytest.raises(IndexError):
+        first[2]
+    with pytest.raises(KeyError):
+        first['price']
+
+
+def make_document_frame():
+    frame = protointerface_pb2.Response().frame
+    document = frame.document_frame.documents.add()
+    entry = document.entries.add()
+    entry.key.string.string = 'id'
+    entry.value.integer.integer = 1
+    entry = document.entries.add()
+    entry.key.string.string = 'tags'
+    entry.value.list.values.add().string.string = 'fruit'
+    entry = document.entries.add()
+    entry.key.string.string = 'origin'
+    inner = entry.value.document.entries.add()
+    inner.key.string.string = 'country'
+    inner.value.string.string = 'Spain'
+    return frame
+
+
+def test_lazy_document():
+    document, = polypheny.rows.lazy_document(make_document_frame())
+    assert document.index is None
+    assert document['origin']['country'] == 'Spain'
+    assert isinstance(document['origin'], polypheny.rows.LazyDocument)
+    assert list(document.cache) == ['origin']
+    assert document == {'id': 1, 'tags': ['fruit'], 'origin': {'country': 'Spain'}}
+    with pytest.raises(KeyError):
+        document['name']
+
+
+def test_ndjson_document():
+    line, = polypheny.rows.ndjson_document(make_document_frame())
+    assert line == b'{"id":1,"tags":["fruit"],"origin":{"country":"Spain"}}\n'
+    documents = polypheny.rows.lazy_document(make_document_frame())
+    assert json.loads(polypheny.rows.ndjson_lines(documents)) == json.loads(line)
+
+
+def build(factory):
+    frame = make_frame()
+    make = factory(RowDecoder(frame.relational_frame.column_meta), describe(frame.relational_frame))
+    return make(frame)
+
+
+def test_tuple_row():
+    assert build(polypheny.rows.tuple_row) == [(1, 'Orange'), (2, None)]
+
+
+def test_namedtuple_row():
+    rows = build(polypheny.rows.namedtuple_row)
+    assert rows[0].name == 'Orange'
+    assert rows[1] == (2, None)
+
+
+def test_dict_row():
+    assert build(polypheny.rows.dict_row) == [{'id': 1, 'name': 'Orange'}, {'id': 2, 'name': None}]
+
+
+def test_dataclass_row():
+    @dataclasses.dataclass
+    class Fruit:
+        ID: int
+        name: str
+        price: float = 1.0
+
+    assert build(polypheny.rows.dataclass_row(Fruit)) == [Fruit(1, 'Orange'), Fruit(2, None)]
+
+    @dataclasses.dataclass
+    class Other:
+        id: int
+
+    with pytest.raises(polypheny.ProgrammingError):
+        build(polypheny.rows.dataclass_row(Other))
+    with pytest.raises(polypheny.ProgrammingError):
+        polypheny.rows.dataclass_row(dict)
+
+
+def test_lazy_row_cursor(cur_with_data):
+    cur = cur_with_data
+    cur.row_factory = polypheny.rows.lazy_row
+    cur.execute('SELECT id, name FROM customers ORDER BY id', fetch_size=3)
+    rows = cur.fetchall()
+    assert isinstance(rows[0], polypheny.rows.LazyRow)
+    assert rows[0]['name'] == 'Maria'
+    assert [row['id'] for row in rows] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_connection_row_factory(con, cur_with_data):
+    con.row_factory = polypheny.rows.dict_row
+    cur = con.cursor()
+    cur.execute('SELECT id, name FROM customers WHERE id = 1')
+    assert cur.fetchone() == {'id': 1, 'name': 'Maria'}
+    cur.row_factory = None
+    cur.execute('SELECT id, name FROM customers WHERE id = 1')
+    assert cur.fetchone() == [1, 'Maria']
+    cur.close()
@@ -46,6 +46,70 @@ def test_serialize_decimal_local():
     decimals = {2**64, -2**64, 0, 0.49, 0.5, 0.51, -0.49, -0.5, -0.51}
     for d in map(decimal.Decimal, decimals):
         assert polypheny.serialize.proto2py(polypheny.serialize.py2proto(d)) == d
+        v = polypheny.serialize.value_pb2.ProtoValue()
+        polypheny.serialize.serialize_big_decimal(v, d)
+        assert polypheny.serialize.proto2py(v) == d
+
+def test_register_encoder():
+    import fractions
+    assert fractions.Fraction not in polypheny.serialize.ENCODERS
+    with pytest.raises(NotImplementedError):
+        polypheny.serialize.py2proto(fractions.Fraction(1, 3))
+
+    def encode_fraction(value, v):
+        v.string.string = str(value)
+
+    polypheny.serialize.register_encoder(fractions.Fraction, encode_fraction)
+    try:
+        v = polypheny.serialize.py2proto([fractions.Fraction(1, 3)])
+        assert polypheny.serialize.proto2py(v) == ['1/3']
+    finally:
+        del polypheny.serialize.ENCODERS[fractions.Fraction]
+
+def test_register_decoder():
+    v = polypheny.serialize.py2proto('abc')
+    old = polypheny.serialize.DECODERS['string']
+    polypheny.serialize.register_decoder('string', lambda value: value.string.string.upper())
+    try:
+        assert polypheny.serialize.proto2py(v) == 'ABC'
+    finally:
+        polypheny.serialize.register_decoder('string', old)
+    assert polypheny.serialize.proto2py(v) == 'abc'
+    with pytest.raises(polypheny.ProgrammingError):
+        polypheny.serialize.register_decoder('no_such_field', old)
+
+def test_row_decoder_unexpected_field():
+    from org.polypheny.prism import protointerface_pb2
+    from polypheny.connection import RowDecoder
+    frame = protointerface_pb2.Response().frame
+    cm = frame.relational_frame.column_meta.add()
+    cm.is_nullable = False
+    cm.type_meta.proto_value_type = polypheny.serialize.value_pb2.ProtoPolyType.INTEGER
+    frame.relational_frame.rows.add().values.add().string.string = 'a'
+    frame.relational_frame.rows.add().values.add().integer.integer = 5
+    frame.relational_frame.rows.add().values.add().integer.integer = 0
+    frame.relational_frame.rows.add().values.add().null.SetInParent()
+    frame.relational_frame.rows.add().values.add().string.string = 'b'
+    decode = RowDecoder(frame.relational_frame.column_meta)
+    assert decode(frame) == [['a'], [5], [0], [None], ['b']]
+
+def test_decode_deep_nesting():
+    value = polypheny.serialize.value_pb2.ProtoValue()
+    inner = value
+    for _ in range(5000):
+        entry = inner.document.entries.add()
+        entry.key.string.string = 'k'
+        inner = entry.value.list.values.add()
+    inner.string.string = 'deep'
+    result = polypheny.serialize.proto2py(value)
+    for _ in range(5000):
+        result = result['k'][0]
+    assert result == 'deep'
+
+def test_nested_json():
+    value = polypheny.serialize.py2proto([1, 2.5, float('nan'), 'ä"', None, datetime.date(2024, 5, 17), b'\x00', [True]])
+    text = ''.join(polypheny.serialize.nested_json([], value.list.values, False))
+    assert text == '[1,2.5,null,"ä\\"",null,"2024-05-17","AA==",[true]]'
 
 def test_serialize_floats(cur):
     cur.execute('DROP TABLE IF EXISTS t')
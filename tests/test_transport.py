@@ -0,0 +1,123 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+
+import polypheny
+import pytest
+
+from polypheny import rpc
+
+VERSION = rpc.PlainTransport.VERSION.encode() + b'\n'
+
+
+def peer(frames, chunk_size):
+    """
+    Starts a fake server that sends each frame in ``chunk_size`` pieces,
+    so the client sees partial reads.
+    """
+    server = socket.create_server(('127.0.0.1', 0))
+
+    def run():
+        c, _ = server.accept()
+        with c:
+            c.sendall(bytes([len(VERSION)]) + VERSION)
+            c.recv(len(VERSION) + 1)
+            for frame in frames:
+                raw = len(frame).to_bytes(8, 'little') + frame
+                for i in range(0, len(raw), chunk_size):
+                    c.sendall(raw[i:i + chunk_size])
+        server.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    return server.getsockname()
+
+
+def test_recv_partial_frames():
+    frames = [b'a' * 10, b'', bytes(range(256)) * 1024, b'b' * 3]
+    t = rpc.PlainTransport(peer(frames, 1000))
+    try:
+        for frame in frames:
+            assert t.recv_msg() == frame
+        with pytest.raises(EOFError):
+            t.recv_msg()
+    finally:
+        t.close()
+
+
+def test_recv_reuses_buffer():
+    t = rpc.PlainTransport(peer([b'x' * 100, b'y' * 200], 7))
+    try:
+        buf = t.buf
+        assert t.recv_msg() == b'x' * 100
+        assert t.recv_msg() == b'y' * 200
+        assert t.buf is buf
+    finally:
+        t.close()
+
+
+def test_recv_large_frame_keeps_buffer():
+    large = b'l' * (rpc.INITIAL_BUFFER_SIZE + 1)
+    t = rpc.PlainTransport(peer([large, b's' * 10], 65536))
+    try:
+        buf = t.buf
+        assert t.recv_msg() == large
+        assert t.recv_msg() == b's' * 10
+        assert t.buf is buf
+        assert len(t.buf) == rpc.INITIAL_BUFFER_SIZE
+    finally:
+        t.close()
+
+
+def test_recv_max_frame_size():
+    t = rpc.PlainTransport(peer([b'z' * 1000], 1000), max_frame_size=999)
+    try:
+        with pytest.raises(polypheny.Error):
+            t.recv_msg()
+    finally:
+        t.close()
+
+
+def socketpair_transport():
+    a, b = socket.socketpair()
+    t = rpc.PlainTransport.__new__(rpc.PlainTransport)
+    t.con = a
+    t.init_buffer(None)
+    return t, b
+
+
+def test_send_msgs(monkeypatch):
+    monkeypatch.setattr(rpc, 'IOV_MAX', 3)
+    t, b = socketpair_transport()
+    messages = [b'first', b'', b'c' * 100000, b'last']
+    received = bytearray()
+
+    def drain():
+        while True:
+            chunk = b.recv(65536)
+            if not chunk:
+                break
+            received.extend(chunk)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    t.send_msgs(messages)
+    t.send_msg(b'single')
+    t.close()
+    reader.join()
+    b.close()
+
+    expected = b''.join(len(m).to_bytes(8, 'little') + m for m in messages + [b'single'])
+    assert bytes(received) == expected
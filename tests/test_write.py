@@ -0,0 +1,110 @@
+# Copyright 2024 The Polypheny Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import polypheny
+import pytest
+
+from polypheny.columns import object_column, table_columns
+from polypheny.serialize import encode_str, proto2py, py2proto
+from org.polypheny.prism import value_pb2
+
+from test_helper import con, cur, cur_with_data
+
+
+def roundtrip(data):
+    names, values, encoders = table_columns(data)
+    result = {}
+    for name, column, encoder in zip(names, values, encoders):
+        decoded = []
+        for value in column:
+            v = value_pb2.ProtoValue()
+            encoder(value, v)
+            decoded.append(proto2py(v))
+        result[name] = decoded
+    return result
+
+
+def test_table_columns_numpy():
+    np = pytest.importorskip('numpy')
+    columns = roundtrip({
+        'i': np.arange(2),
+        'f': np.ma.MaskedArray([1.5, 2.5], [False, True]),
+        't': np.array(['2024-05-17T13:37:42.123', 'NaT'], 'datetime64[ms]'),
+        'l': ['a', 3],
+    })
+    assert columns['i'] == [0, 1]
+    assert columns['f'] == [1.5, None]
+    assert columns['t'] == [datetime.datetime(2024, 5, 17, 13, 37, 42, 123000, tzinfo=datetime.timezone.utc), None]
+    assert columns['l'] == ['a', 3]
+
+
+def test_table_columns_pandas():
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({
+        'n': pd.array([1, None], 'Int64'),
+        's': ['a', None],
+        't': pd.to_datetime(['2024-05-17 15:00:00.123456789', None]).tz_localize('Europe/Zurich'),
+    })
+    columns = roundtrip(df)
+    assert columns['n'] == [1, None]
+    assert columns['s'] == ['a', None]
+    assert columns['t'] == [datetime.datetime(2024, 5, 17, 13, 0, 0, 123000, tzinfo=datetime.timezone.utc), None]
+
+
+def test_table_columns_arrow():
+    pa = pytest.importorskip('pyarrow')
+    columns = roundtrip(pa.table({
+        'i': [1, None],
+        'd': pa.array([datetime.date(2024, 5, 17), None]),
+        'b': [b'a', b'b'],
+        't': pa.array([datetime.datetime(2024, 5, 17, 13, 37, 42, 123456), None], pa.timestamp('us')),
+    }))
+    assert columns['i'] == [1, None]
+    assert columns['d'] == [datetime.date(2024, 5, 17), None]
+    assert columns['b'] == [b'a', b'b']
+    assert columns['t'] == [datetime.datetime(2024, 5, 17, 13, 37, 42, 123000, tzinfo=datetime.timezone.utc), None]
+
+
+def test_object_column():
+    assert object_column(['a', 'b'])[1] is encode_str
+    assert object_column(['a', None])[1] is not py2proto
+    assert object_column(['a', 3])[1] is py2proto
+    assert object_column([None, None])[1] is py2proto
+    columns = roundtrip({'s': ['a', None], 'n': [None, 2 ** 40]})
+    assert columns == {'s': ['a', None], 'n': [None, 2 ** 40]}
+
+
+def test_table_columns_errors():
+    with pytest.raises(polypheny.ProgrammingError):
+        table_columns([(1, 2)])
+    with pytest.raises(polypheny.ProgrammingError):
+        table_columns({'a': [1, 2], 'b': [1]})
+
+
+def test_write_table(con, cur_with_data):
+    cur = cur_with_data
+    n = con.write_table('customers', {'id': [8, 9, 10], 'name': ['Eva', 'Jan', 'Lea'],
+                                      'year_joined': [2020, 2021, 2022]}, chunk_rows=2)
+    assert n == 3
+    cur.execute('SELECT name FROM customers WHERE id > 7 ORDER BY id')
+    assert cur.fetchall() == [['Eva'], ['Jan'], ['Lea']]
+
+
+def test_write_table_error(con, cur_with_data):
+    with pytest.raises(polypheny.Error, match='Chunk 1 with rows 2 to 3 failed'):
+        con.write_table('customers', {'id': [8, 9, 1, 10], 'name': ['a', 'b', 'c', 'd'],
+                                      'year_joined': [2020, 2021, 2022, 2023]}, chunk_rows=2)
+    con.rollback()